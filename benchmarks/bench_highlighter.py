@@ -0,0 +1,115 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmark of the ChordPro syntax highlighter. Highlights a generated songbook with the current highlighter and
+with the old one, which ran one QRegExp per rule over every block, and prints the cost per block.
+
+    $ python3 benchmarks/bench_highlighter.py --songs 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QRegExp
+from PyQt5.QtGui import QGuiApplication, QSyntaxHighlighter, QTextDocument
+
+from gui.syntax import STYLES, ChordProHighlighter
+
+SONG = '''{title: Song %d}
+{subtitle: Artist}
+{c: Intro}
+[G]  [D/F#]  [Em]  [C]
+{soc}
+[G]This is the [D]chorus of the [Em]song, it [C]goes on and on
+[G]Sing it a[D]gain, all [Em]night [C]long
+{eoc}
+{textsize: 12}
+Verse with [Am7]some [Dsus4]chords and a lot of plain lyrics in between them
+{sot}
+e|-----0-----0---|
+B|---1---1-----1-|
+{eot}
+{np}
+'''
+
+
+class LegacyHighlighter(QSyntaxHighlighter):
+    """
+    The highlighter as it was before it was rewritten on a single expression.
+    """
+    # ChordPro keywords
+    keywords = [
+        'new_song', 'ns', 'start_of_chorus', 'soc', 'end_of_chorus', 'eoc', 'start_of_tab', 'sot', 'end_of_tab', 'eot',
+        'define', 'no_grid', 'ng', 'grid', 'g', 'new_page', 'np', 'new_physical_page', 'npp', 'column_break', 'colb'
+    ]
+    argumentKeywords = [
+        'title', 't', 'subtitle', 'st', 'comment', 'c', 'comment_italic', 'ci', 'comment_box', 'cb', 'textfont',
+        'textsize', 'chordfont', 'chordsize', 'titles', 'columns', 'col', 'pagetype'
+    ]
+    keywords.extend(argumentKeywords)
+
+    def __init__(self, document):
+        QSyntaxHighlighter.__init__(self, document)
+        rules = []
+        rules += [(r'\{%s\:(.)*\}' % w, 0, STYLES['argument']) for w in self.argumentKeywords]
+        rules += [(r'\{%s\:?' % w, 0, STYLES['keyword']) for w in self.keywords]
+        rules += [(r'%s' % b, 0, STYLES['curlyBrace']) for b in [r'\{', r'\}']]
+        rules += [(r'\[[^\]]*\]', 0, STYLES['chord'])]
+        self.rules = [(QRegExp(pat), index, fmt) for (pat, index, fmt) in rules]
+
+    def highlightBlock(self, text):
+        for expression, nth, fmt in self.rules:
+            index = expression.indexIn(text, 0)
+            while index >= 0:
+                index = expression.pos(nth)
+                length = len(expression.cap(nth))
+                self.setFormat(index, length, fmt)
+                index = expression.indexIn(text, index + length)
+        self.setCurrentBlockState(0)
+
+
+def bench(highlighter_class, text, repeat):
+    document = QTextDocument()
+    document.setPlainText(text)
+    highlighter = highlighter_class(document)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        highlighter.rehighlight()
+        best = min(best, time.perf_counter() - start)
+    return best / document.blockCount()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ChordPro syntax highlighter.')
+    parser.add_argument('--songs', type=int, default=100, help='number of songs in the generated document')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs, the fastest one is reported')
+    args = parser.parse_args()
+
+    app = QGuiApplication(sys.argv)
+    text = ''.join(SONG % i for i in range(args.songs))
+    for name, highlighter_class in [('old', LegacyHighlighter), ('new', ChordProHighlighter)]:
+        print('{:4} {:8.1f} us/block'.format(name, bench(highlighter_class, text, args.repeat) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
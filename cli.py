@@ -0,0 +1,168 @@
+# coding: utf-8
+
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import sys
+
+from model.songbook import Songbook
+from utils.build import build_incremental, build_songbook
+from settings import settings
+from utils.chordii import ChordiiError
+from utils.compilecache import CompileCache, DEFAULT_MAX_SIZE
+from utils.ps2pdf import Ps2PdfError
+from utils.timing import Timings
+from utils.toolchain import GS, TOOL_NAMES, Toolchain
+
+
+def positive_int(value):
+    """
+    Argument type for counts that must be at least 1.
+    :type value: str
+    :rtype: int
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1, not {}'.format(number))
+    return number
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Build a Chordii songbook without starting the GUI.')
+    parser.add_argument('project', help='the project file to build')
+    parser.add_argument('-o', '--output', help='the pdf file to write (default: output/<songbook name>.pdf next to '
+                                               'the project file)')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=1,
+                        help='the number of songs to compile at the same time')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='only recompile songs that changed since the last build')
+    parser.add_argument('--chordii', help='the chordii executable (default: chordii or chordii430 in the PATH)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_SIZE // 2 ** 20,
+                        help='the size limit of the build cache in MB')
+    parser.add_argument('--cache-info', action='store_true', help='list the contents of the build cache and exit')
+    parser.add_argument('--trace', metavar='FILE', help='save the timings of the build as a Chrome trace (JSON), '
+                                                         'which chrome://tracing can show')
+    parser.add_argument('--tools', action='store_true', help='list the programs used to build and their versions, '
+                                                             'and exit')
+    return parser.parse_args(argv)
+
+
+def save_toolchain(toolchain):
+    """
+    Remember the tools found, so that the next build does not have to look for them.
+    :type toolchain: Toolchain
+    """
+    if toolchain.changed:
+        settings.save_toolchain(toolchain.search_path, toolchain.results())
+
+
+def main(argv=None):
+    """
+    Build a songbook from the command line.
+    :return: The exit status: 0 on success, 1 if the songbook could not be built
+    :rtype: int
+    """
+    args = parse_arguments(argv)
+    timings = Timings()
+    settings.set_up_settings()
+    saved = settings.load_toolchain()
+    toolchain = Toolchain(saved[settings.key_search_path], saved[settings.key_tools])
+
+    if args.tools:
+        for name in TOOL_NAMES:
+            tool = toolchain.resolve(name)
+            print('{:<10}  {}  {}'.format(name, tool.path, tool.version) if tool else '{:<10}  not found'.format(name))
+        save_toolchain(toolchain)
+        return 0
+
+    with timings.stage('load'):
+        songbook = Songbook()
+        try:
+            songbook.load(args.project)
+        except (OSError, ValueError, KeyError) as e:
+            print('Could not load {}: {}'.format(args.project, e), file=sys.stderr)
+            return 1
+    out_dir = os.path.join(os.path.dirname(os.path.abspath(args.project)), 'output')
+    cache = CompileCache(os.path.join(out_dir, '.cache'), args.cache_size * 2 ** 20)
+
+    if args.cache_info:
+        print('{} compiled songs, using {:.1f} of {:.1f} MB'.format(len(cache), cache.total_size() / 2 ** 20,
+                                                                   cache.max_size / 2 ** 20))
+        for key, entry in cache.entries():
+            print('{}  {}  {} page(s)  {}'.format(key[:12], ' '.join(entry['flags']), entry['pages'],
+                                                  entry['source']))
+        return 0
+
+    missing_songs = [song for song in songbook.songs if not os.path.isfile(song.file_path)]
+    if missing_songs:
+        print('The following project files are missing:', file=sys.stderr)
+        for song in missing_songs:
+            print('    {} - {} ({})'.format(song.artist, song.title, song.file_path), file=sys.stderr)
+        return 1
+
+    chordii_command = args.chordii or toolchain.chordii()
+    gs_command = toolchain.path(GS)
+    save_toolchain(toolchain)
+    if chordii_command is None:
+        print("Couldn't find a chordii executable in the PATH. Use --chordii to specify its location.",
+              file=sys.stderr)
+        return 1
+    if gs_command is None:
+        print("Couldn't find Ghostscript (gs) in the PATH. It is needed to convert the output of chordii to PDF.",
+              file=sys.stderr)
+        return 1
+
+    if args.output:
+        output_file = os.path.splitext(args.output)[0]
+    else:
+        output_file = os.path.join(out_dir, songbook.name)
+    if not os.path.exists(os.path.dirname(os.path.abspath(output_file))):
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)))
+
+    try:
+        if args.incremental or args.jobs > 1:
+            pdf_file, warnings = build_incremental(chordii_command, songbook.songs, output_file, cache,
+                                                   args.jobs, timings, gs_command)
+        else:
+            pdf_file, warnings = build_songbook(chordii_command, songbook.songs, output_file, gs_command=gs_command,
+                                                timings=timings)
+    except ChordiiError as e:
+        print('Chordii crashed while compiling.', file=sys.stderr)
+        print(e.output or 'Tip: This could be due to an incorrect chord definition.', file=sys.stderr)
+        return 1
+    except Ps2PdfError as e:
+        print('Converting the songbook to PDF failed.', file=sys.stderr)
+        if e.output:
+            print('Ghostscript output:', file=sys.stderr)
+            print(e.output, file=sys.stderr)
+        return 1
+    finally:
+        print(timings.report())
+        if args.trace:
+            timings.save_trace(args.trace)
+
+    if warnings:
+        print('Chordii exited with warnings:', file=sys.stderr)
+        print(warnings, file=sys.stderr)
+    print('Wrote {}'.format(pdf_file))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
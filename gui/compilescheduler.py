@@ -0,0 +1,247 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from itertools import count
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from utils.chordii import ChordiiError
+from utils.ps2pdf import Ps2PdfError
+
+# Request priorities, most urgent first
+PREVIEW = 0
+PREFETCH = 1
+BUILD = 2
+
+MAX_JOBS = 2
+RESULT_CACHE_SIZE = 32
+
+logger = logging.getLogger(__name__)
+
+
+def song_key(file_name, text):
+    """
+    The key of a request to compile a song, which is the same for every request with the same file and content.
+    :type file_name: str
+    :type text: str
+    :rtype: tuple
+    """
+    return file_name, hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class CompileSignals(QObject):
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, object)
+
+
+class CompileJob(QRunnable):
+    """
+    Runs a compile request on a worker thread.
+    """
+    def __init__(self, key, priority, sequence, work, cache):
+        """
+        :param work: Does the work, given a function to call with every process it starts. Its return value is the
+            result of the job.
+        :type work: callable
+        :param cache: Whether the result is kept for later requests with the same key
+        :type cache: bool
+        """
+        super().__init__()
+        self.key = key
+        self.priority = priority
+        self.sequence = sequence
+        self.work = work
+        self.cache = cache
+        self.signals = CompileSignals()
+        self._cancelled = False
+        self._processes = []
+        self._lock = threading.Lock()
+
+    def is_cancelled(self):
+        with self._lock:
+            return self._cancelled
+
+    def cancel(self):
+        """
+        Stop the job, killing the processes it is waiting for.
+        """
+        with self._lock:
+            self._cancelled = True
+            for process in self._processes:
+                if process.poll() is None:
+                    process.kill()
+
+    def _started(self, process):
+        with self._lock:
+            self._processes.append(process)
+            if self._cancelled:
+                process.kill()
+
+    def run(self):
+        if self.is_cancelled():
+            return
+        try:
+            result = self.work(self._started)
+        except (ChordiiError, Ps2PdfError, OSError, UnicodeError) as e:
+            if not self.is_cancelled():
+                self.signals.failed.emit(self.sequence, e)
+            return
+        except Exception as e:
+            # An exception escaping run() would abort the application, so report any other error as a failure too
+            logger.exception('Compile job %s failed', self.key)
+            if not self.is_cancelled():
+                self.signals.failed.emit(self.sequence, RuntimeError('{}: {}'.format(type(e).__name__, e)))
+            return
+        if not self.is_cancelled():
+            self.signals.finished.emit(self.sequence, result)
+
+
+class CompileScheduler(QObject):
+    """
+    Runs compile requests in the background, at most max_jobs at a time and the most urgent first: the preview of the
+    song being shown, then songs prefetched in case they are shown next, then songbook builds.
+
+    A request for something that is already queued or running is merged with it, and the results of songs are kept,
+    so that a song is compiled only once for every version of its text. A preview preempts a prefetch when all jobs
+    are busy. Requests that are no longer needed are dropped with drop().
+    """
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+
+    def __init__(self, parent=None, max_jobs=MAX_JOBS):
+        super().__init__(parent)
+        self.max_jobs = max_jobs
+        self.pool = QThreadPool(self)
+        # Cancelled jobs may take a moment to notice, so leave room for them next to max_jobs running ones
+        self.pool.setMaxThreadCount(max(self.pool.maxThreadCount(), 2 * max_jobs))
+        self.sequence = count()
+        self.pending = {}
+        self.running = {}
+        self.results = OrderedDict()
+
+    def submit(self, key, priority, work, cache=True):
+        """
+        Request a compile. finished or failed is emitted with the key once it is done, right away if the result is
+        already known.
+        :param key: Identifies what is compiled, e.g. song_key() of a song
+        :param priority: PREVIEW, PREFETCH or BUILD
+        :type priority: int
+        :param work: Does the work, given a function to call with every process it starts, e.g. the on_start argument
+            of run_chordii_to_pdf
+        :type work: callable
+        :param cache: Whether to keep the result for later requests with the same key
+        :type cache: bool
+        """
+        if key in self.results:
+            self.results.move_to_end(key)
+            self.finished.emit(key, self.results[key])
+            return
+        job = self.find(key)
+        if job is not None:
+            job.priority = min(job.priority, priority)
+            return
+        self.pending[key] = CompileJob(key, priority, next(self.sequence), work, cache)
+        self._dispatch()
+
+    def find(self, key):
+        """
+        :return: The queued or running job for key, or None
+        :rtype: CompileJob
+        """
+        if key in self.pending:
+            return self.pending[key]
+        return next((job for job in self.running.values() if job.key == key), None)
+
+    def drop(self, priority, keep=()):
+        """
+        Cancel the queued and running requests with the given priority, e.g. the preview of a song that is no longer
+        shown.
+        :type priority: int
+        :param keep: The keys of requests to leave alone
+        :type keep: collections.abc.Container
+        """
+        for key, job in list(self.pending.items()):
+            if job.priority == priority and key not in keep:
+                del self.pending[key]
+        for sequence, job in list(self.running.items()):
+            if job.priority == priority and job.key not in keep:
+                job.cancel()
+                del self.running[sequence]
+        self._dispatch()
+
+    def cancel(self):
+        self.pending.clear()
+        for job in self.running.values():
+            job.cancel()
+        self.running.clear()
+
+    def wait(self):
+        """
+        Cancel all jobs and wait for them to stop.
+        """
+        self.cancel()
+        self.pool.waitForDone()
+
+    def _dispatch(self):
+        while self.pending:
+            job = min(self.pending.values(), key=lambda job: (job.priority, job.sequence))
+            if len(self.running) >= self.max_jobs and not self._preempt(job.priority):
+                break
+            del self.pending[job.key]
+            self.running[job.sequence] = job
+            job.signals.finished.connect(self._finished)
+            job.signals.failed.connect(self._failed)
+            self.pool.start(job)
+
+    def _preempt(self, priority):
+        """
+        Make room for a preview by putting the newest running prefetch back in the queue.
+        :return: Whether a job was stopped
+        :rtype: bool
+        """
+        if priority != PREVIEW:
+            return False
+        prefetches = [job for job in self.running.values() if job.priority == PREFETCH]
+        if not prefetches:
+            return False
+        job = max(prefetches, key=lambda job: job.sequence)
+        job.cancel()
+        del self.running[job.sequence]
+        self.pending[job.key] = CompileJob(job.key, job.priority, next(self.sequence), job.work, job.cache)
+        return True
+
+    def _finished(self, sequence, result):
+        job = self.running.pop(sequence, None)
+        if job is None:
+            return
+        if job.cache:
+            self.results[job.key] = result
+            while len(self.results) > RESULT_CACHE_SIZE:
+                self.results.popitem(last=False)
+        self.finished.emit(job.key, result)
+        self._dispatch()
+
+    def _failed(self, sequence, error):
+        job = self.running.pop(sequence, None)
+        if job is None:
+            return
+        self.failed.emit(job.key, error)
+        self._dispatch()
@@ -43,6 +43,7 @@ class CustomTextEdit(QTextEdit):
         self.main = main
 
     def insertFromMimeData(self, source):
+        start = self.textCursor().selectionStart()
         self.insertPlainText(source.text())
         if self.main is not None:
-            self.main.tab2chordpro()
+            self.main.tab2chordpro(start, self.textCursor().position())
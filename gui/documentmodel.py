@@ -0,0 +1,82 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+from PyQt5.QtCore import QObject
+
+from model.chordpro import ChordProDocument, parse_line
+
+
+class DocumentModel(QObject):
+    """
+    Keeps a ChordProDocument in step with a QTextDocument, one line per block. On an edit, only the blocks it touched
+    are parsed again, along with the following blocks whose region state changes. revision is the revision of the
+    QTextDocument the model was last updated to.
+    """
+    def __init__(self, text_document):
+        super().__init__(text_document)
+        self.text_document = text_document
+        self.document = ChordProDocument()
+        self.revision = -1
+        self.reset()
+        text_document.contentsChange.connect(self.contents_change)
+
+    def reset(self):
+        texts = []
+        block = self.text_document.begin()
+        while block.isValid():
+            texts.append(block.text())
+            block = block.next()
+        self.document.set_lines(texts)
+        self.revision = self.text_document.revision()
+
+    def contents_change(self, position, removed, added):
+        first = self.text_document.findBlock(position)
+        last = self.text_document.findBlock(position + added)
+        if not last.isValid():
+            last = self.text_document.lastBlock()
+        # The edit replaced the blocks from first to last, changing the number of blocks by the difference in counts
+        count = (last.blockNumber() - first.blockNumber() + 1 -
+                 (self.text_document.blockCount() - len(self.document.lines)))
+        if not first.isValid() or count < 0 or first.blockNumber() + count > len(self.document.lines):
+            self.reset()
+            return
+        texts = []
+        block = first
+        while block.isValid() and block.blockNumber() <= last.blockNumber():
+            texts.append(block.text())
+            block = block.next()
+        self.document.replace_lines(first.blockNumber(), count, texts)
+        self.revision = self.text_document.revision()
+
+    def line(self, number, text, state):
+        """
+        The parsed line of a block. If the model has not seen the block as it is yet, e.g. while the document is
+        being changed, the block is parsed on its own.
+        :param number: The block number
+        :type number: int
+        :param text: The text of the block
+        :type text: str
+        :param state: The region state at the start of the block
+        :type state: int
+        :rtype: model.chordpro.Line
+        """
+        lines = self.document.lines
+        if number < len(lines):
+            line = lines[number]
+            if line.state == state and line.text == text:
+                return line
+        return parse_line(text, state)
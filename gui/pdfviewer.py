@@ -15,68 +15,350 @@
 # You should have received a copy of the GNU General Public License
 # along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
 
-from popplerqt5 import Poppler
-from PyQt5.QtGui import QPixmap
-from PyQt5.QtWidgets import QScrollArea, QWidget, QVBoxLayout, QLabel
+import bisect
+from collections import OrderedDict, defaultdict
+
+from PyQt5.QtCore import Qt, QByteArray, QObject, QRect, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QScrollArea, QWidget
+
+from utils.timing import stage
+
+PAGE_SPACING = 10
+PREFETCH_MARGIN = 1.0
+CACHE_BUDGET = 128 * 1024 * 1024
+ZOOM_LEVELS = [0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 3.0]
+DPI_STEP = 6
+LOW_DPI = 36
+RERENDER_DELAY = 200
+
+
+def poppler():
+    """
+    The Poppler module. popplerqt5 is slow to import, so it is imported when the first document is shown.
+    """
+    from popplerqt5 import Poppler
+    return Poppler
+
+
+def dpi_bucket(dpi):
+    """
+    Round a resolution down to a multiple of DPI_STEP, so that pages are re-rendered only when the resolution
+    changes noticeably.
+    :rtype: int
+    """
+    return max(DPI_STEP, int(dpi // DPI_STEP) * DPI_STEP)
+
+
+class PageCache:
+    """
+    Least recently used cache of rendered pages, holding at most budget bytes of images. Pages are keyed by
+    (page index, dpi), so renderings at several zoom levels can be kept at the same time.
+    """
+    def __init__(self, budget=CACHE_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self._images = OrderedDict()
+        self._dpis = defaultdict(set)
+
+    def get(self, key):
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+        return image
+
+    def best(self, idx, dpi):
+        """
+        The rendering of a page closest to dpi, preferring sharper renderings.
+        :return: The image and its dpi, or (None, None) if the page has not been rendered
+        :rtype: tuple
+        """
+        if not self._dpis.get(idx):
+            return None, None
+        best_dpi = min(self._dpis[idx], key=lambda d: (abs(d - dpi), -d))
+        return self.get((idx, best_dpi)), best_dpi
+
+    def put(self, key, image):
+        if key in self._images:
+            self._remove(key)
+        self._images[key] = image
+        self._dpis[key[0]].add(key[1])
+        self.size += image.byteCount()
+        while self.size > self.budget and len(self._images) > 1:
+            self._remove(next(iter(self._images)))
+
+    def _remove(self, key):
+        self.size -= self._images.pop(key).byteCount()
+        self._dpis[key[0]].discard(key[1])
+
+    def clear(self):
+        self._images.clear()
+        self._dpis.clear()
+        self.size = 0
+
+    def __contains__(self, key):
+        return key in self._images
+
+
+class RenderSignals(QObject):
+    rendered = pyqtSignal(int, int, int, QImage)
+
+
+class RenderJob(QRunnable):
+    """
+    Renders a page on a worker thread. Pages that scrolled out of view while the job was queued are skipped, and
+    reported with a null image.
+    """
+    def __init__(self, viewer, generation, idx, dpi):
+        super().__init__()
+        self.doc = viewer.doc
+        self.wanted = viewer.wanted
+        self.generation = generation
+        self.idx = idx
+        self.dpi = dpi
+        self.timings = viewer.timings
+        self.signals = RenderSignals()
+        self.signals.rendered.connect(viewer.page_rendered)
+
+    def run(self):
+        image = QImage()
+        if self.idx in self.wanted:
+            with stage(self.timings, 'render', page=self.idx, dpi=self.dpi):
+                image = self.doc.page(self.idx).renderToImage(self.dpi, self.dpi)
+        self.signals.rendered.emit(self.generation, self.idx, self.dpi, image)
+
+
+class PageCanvas(QWidget):
+    def __init__(self, viewer):
+        super().__init__()
+        self.viewer = viewer
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        self.viewer.paint_pages(painter, event.rect())
+        painter.end()
 
 
 class PDFViewer(QScrollArea):
+    """
+    Shows the pages of a PDF document below each other. Only the pages in and around the viewport are rendered, on a
+    background thread, and pages that have not been rendered yet are shown as blank pages of the right size.
+
+    New pages are first rendered at LOW_DPI, which is fast, and then at the resolution they are shown at. After a
+    resize or zoom the pages are scaled from the closest rendering until the size has settled for RERENDER_DELAY
+    milliseconds, and are then rendered sharp again.
+
+    page_ready is emitted with the index of every page rendered. If timings is set, loading documents and rendering
+    pages is timed.
+    """
+    page_ready = pyqtSignal(int)
+
     def __init__(self, parent):
         super().__init__(parent)
         self.setWidgetResizable(True)
         self.doc = None
+        self.timings = None
         self.is_blanked = True
-        self.current_page = 0
-        self.pdf_images = []
-        self.scroll_layout = None
+        self.generation = 0
+        self.zoom = 1.0
+        self.dpi = 72
+        self.settled = True
+        self.page_sizes = []
+        self.page_rects = []
+        self.page_tops = []
+        self.wanted = set()
+        self.pending = set()
+        self.cache = PageCache()
+        # Poppler documents must not be rendered from several threads at once
+        self.render_pool = QThreadPool(self)
+        self.render_pool.setMaxThreadCount(1)
+        self.canvas = PageCanvas(self)
+        self.setWidget(self.canvas)
+        self.verticalScrollBar().valueChanged.connect(self.prefetch)
+        self.rerender_timer = QTimer(self)
+        self.rerender_timer.setSingleShot(True)
+        self.rerender_timer.setInterval(RERENDER_DELAY)
+        self.rerender_timer.timeout.connect(self.settle)
 
     def load(self, filename):
-        self.doc = Poppler.Document.load(filename)
-        self.doc.setRenderHint(
-                Poppler.Document.Antialiasing and Poppler.Document.TextAntialiasing)
-        self.current_page = 0
-        self.pdf_images = [None for i in range(self.doc.numPages())]
-        self.cache_image(self.current_page)
+        document = poppler().Document
+        with stage(self.timings, 'load'):
+            doc = document.load(filename)
+        self.set_document(doc)
+
+    def load_data(self, data):
+        """
+        Show a PDF held in memory.
+        :type data: bytes
+        """
+        document = poppler().Document
+        with stage(self.timings, 'load', size=len(data)):
+            doc = document.loadFromData(QByteArray(data))
+        self.set_document(doc)
+
+    def set_document(self, doc):
+        self.doc = doc
+        self.doc.setRenderHint(poppler().Document.Antialiasing)
+        self.doc.setRenderHint(poppler().Document.TextAntialiasing)
+        self.generation += 1
+        self.wanted.clear()
+        self.pending.clear()
+        self.cache.clear()
+        self.page_sizes = [self.doc.page(i).pageSize() for i in range(self.doc.numPages())]
+        self.settled = True
+        self.layout_pages()
         self.un_blank()
-        self.paintEvent(None)
+        self.prefetch()
 
-    def cache_image(self, idx):
-        if idx >= self.doc.numPages():
-            return
-        if self.pdf_images[idx] is not None:
+    def layout_pages(self):
+        """
+        Place the pages below each other, scaled to fit the width of the viewer times the zoom factor.
+        """
+        self.page_rects = []
+        self.page_tops = []
+        if not self.page_sizes:
+            self.canvas.setFixedSize(0, 0)
             return
-        page = self.doc.page(idx)
         scroll_width = self.verticalScrollBar().sizeHint().width()
-        ratio = 1.0 * (self.frameSize().width() - 1.7 * scroll_width) / page.pageSize().width()
-        self.pdf_images[idx] = page.renderToImage(72 * ratio, 72 * ratio)
+        fit_ratio = 1.0 * (self.frameSize().width() - 1.7 * scroll_width) / self.page_sizes[0].width()
+        # Snapping the resolution to a bucket lets the rendered pages be drawn unscaled
+        self.dpi = dpi_bucket(72 * fit_ratio * self.zoom)
+        ratio = self.dpi / 72
+        width = max(round(size.width() * ratio) for size in self.page_sizes) + 2 * PAGE_SPACING
+        canvas_width = max(width, self.viewport().width())
+        top = PAGE_SPACING
+        for size in self.page_sizes:
+            rect = QRect(0, top, round(size.width() * ratio), round(size.height() * ratio))
+            rect.moveLeft((canvas_width - rect.width()) // 2)
+            self.page_rects.append(rect)
+            self.page_tops.append(top)
+            top += rect.height() + PAGE_SPACING
+        self.canvas.setFixedSize(canvas_width, top)
 
-    def get_image(self, idx):
-        self.cache_image(idx)
-        return self.pdf_images[idx]
+    def relayout(self):
+        """
+        Lay out the pages again after a resize or zoom, keeping the same part of the document in view.
+        """
+        if self.doc is None:
+            return
+        scroll_bar = self.verticalScrollBar()
+        position = scroll_bar.value() / max(1, self.canvas.height())
+        dpi = self.dpi
+        self.layout_pages()
+        scroll_bar.setValue(round(position * self.canvas.height()))
+        if self.dpi != dpi:
+            self.settled = False
+            self.rerender_timer.start()
+        self.canvas.update()
 
-    def blank(self):
-        self.is_blanked = True
-        self.update()
+    def settle(self):
+        self.settled = True
+        self.prefetch()
 
-    def un_blank(self):
-        self.is_blanked = False
-        self.update()
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if event.oldSize().width() != event.size().width():
+            self.relayout()
+        # A taller viewer shows pages that may not have been prefetched
+        self.prefetch()
 
-    def paintEvent(self, event):
-        if self.is_blanked:
+    def set_zoom(self, zoom):
+        """
+        :param zoom: The page width relative to the width of the viewer
+        :type zoom: float
+        """
+        self.zoom = zoom
+        self.relayout()
+
+    def zoom_in(self):
+        self.set_zoom(next((z for z in ZOOM_LEVELS if z > self.zoom), self.zoom))
+
+    def zoom_out(self):
+        self.set_zoom(next((z for z in reversed(ZOOM_LEVELS) if z < self.zoom), self.zoom))
+
+    def zoom_to_fit(self):
+        self.set_zoom(1.0)
+
+    def wheelEvent(self, event):
+        if event.modifiers() & Qt.ControlModifier:
+            if event.angleDelta().y() > 0:
+                self.zoom_in()
+            elif event.angleDelta().y() < 0:
+                self.zoom_out()
+            event.accept()
+        else:
+            super().wheelEvent(event)
+
+    def pages_between(self, top, bottom):
+        """
+        :return: The indices of the pages intersecting the vertical range from top to bottom
+        :rtype: range
+        """
+        first = max(0, bisect.bisect_right(self.page_tops, top) - 1)
+        last = bisect.bisect_right(self.page_tops, bottom)
+        return range(first, last)
+
+    def visible_pages(self, margin=0.0):
+        height = self.viewport().height()
+        top = self.verticalScrollBar().value()
+        return self.pages_between(top - margin * height, top + (1 + margin) * height)
+
+    def prefetch(self):
+        """
+        Render the pages in the viewport and within PREFETCH_MARGIN viewport heights of it. Pages that have not been
+        rendered at all get a quick LOW_DPI rendering first.
+        """
+        if self.doc is None or self.is_blanked:
             return
-        img = self.get_image(0)
-        if img is None:
+        visible = list(self.visible_pages())
+        # Update the set in place, as queued render jobs hold on to it
+        self.wanted.intersection_update(self.visible_pages(PREFETCH_MARGIN))
+        self.wanted.update(self.visible_pages(PREFETCH_MARGIN))
+        # Visible pages are queued first, as the render thread works through the queue in order
+        for idx in visible:
+            if self.cache.best(idx, self.dpi)[0] is None:
+                self.request_page(idx, LOW_DPI)
+        if self.settled:
+            for idx in visible + sorted(self.wanted):
+                self.request_page(idx, self.dpi)
+
+    def request_page(self, idx, dpi):
+        key = (idx, dpi)
+        if key in self.pending or key in self.cache:
             return
+        self.pending.add(key)
+        self.render_pool.start(RenderJob(self, self.generation, idx, dpi))
 
-        scroll_contents = QWidget()
-        self.setWidget(scroll_contents)
-        self.scroll_layout = QVBoxLayout()
-        scroll_contents.setLayout(self.scroll_layout)
+    def page_rendered(self, generation, idx, dpi, image):
+        if generation != self.generation:
+            return
+        self.pending.discard((idx, dpi))
+        if image.isNull():
+            return
+        self.cache.put((idx, dpi), image)
+        self.canvas.update(self.page_rects[idx])
+        self.page_ready.emit(idx)
 
-        for i in range(self.doc.numPages()):
-            img = self.get_image(i)
-            label = QLabel()
-            label.setPixmap(QPixmap(img))
+    def paint_pages(self, painter, rect):
+        if self.is_blanked or self.doc is None:
+            return
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        for idx in self.pages_between(rect.top(), rect.bottom()):
+            page_rect = self.page_rects[idx]
+            image = self.cache.get((idx, self.dpi))
+            if image is None:
+                image = self.cache.best(idx, self.dpi)[0]
+            if image is None:
+                painter.fillRect(page_rect, Qt.white)
+                self.wanted.add(idx)
+                self.request_page(idx, LOW_DPI)
+            else:
+                painter.drawImage(page_rect, image)
+
+    def blank(self):
+        self.is_blanked = True
+        self.canvas.update()
 
-            self.scroll_layout.addWidget(label)
+    def un_blank(self):
+        self.is_blanked = False
+        self.canvas.update()
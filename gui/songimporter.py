@@ -0,0 +1,81 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from model.songindex import read_song_header
+
+POLL_INTERVAL = 50
+
+
+class SongImporter(QObject):
+    """
+    Reads the title and artist of song files on a thread pool. The songs are reported in batches, in the order the
+    files were given, while the import is running. Cancelling stops the files that have not been read yet, but keeps
+    the songs already read. An importer imports one set of files.
+    """
+    songs_read = pyqtSignal(list)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+
+    def __init__(self, parent=None, max_workers=8):
+        super().__init__(parent)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.timer = QTimer(self)
+        self.timer.setInterval(POLL_INTERVAL)
+        self.timer.timeout.connect(self.collect)
+        self.file_paths = []
+        self.futures = []
+        self.next_song = 0
+
+    def start(self, file_paths):
+        """
+        :param file_paths: The song files to import
+        :type file_paths: list
+        """
+        self.file_paths = list(file_paths)
+        self.futures = [self.pool.submit(read_song_header, file_path) for file_path in self.file_paths]
+        self.next_song = 0
+        self.timer.start()
+
+    def cancel(self):
+        for future in self.futures[self.next_song:]:
+            future.cancel()
+        self.collect()
+
+    def collect(self):
+        """
+        Report the songs that have been read since the last call. A song is only reported once all songs before it
+        have been read or cancelled.
+        """
+        batch = []
+        while self.next_song < len(self.futures) and self.futures[self.next_song].done():
+            future = self.futures[self.next_song]
+            if not future.cancelled() and future.exception() is None:
+                title, artist = future.result()
+                batch.append((title, artist, self.file_paths[self.next_song]))
+            self.next_song += 1
+        if batch:
+            self.songs_read.emit(batch)
+        self.progress.emit(self.next_song, len(self.futures))
+        if self.next_song == len(self.futures):
+            self.timer.stop()
+            self.futures = []
+            self.pool.shutdown(wait=False)
+            self.finished.emit()
@@ -0,0 +1,180 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import sqlite3
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QSize, QSortFilterProxyModel, \
+    QT_TRANSLATE_NOOP, pyqtSignal
+
+from model.searchindex import SearchIndex
+from model.songindex import SongIndex, scan_songs
+
+COLUMNS = [QT_TRANSLATE_NOOP('SongTableModel', 'Title'), QT_TRANSLATE_NOOP('SongTableModel', 'Artist'),
+           QT_TRANSLATE_NOOP('SongTableModel', 'Key')]
+TITLE_COLUMN, ARTIST_COLUMN, KEY_COLUMN = range(len(COLUMNS))
+
+logger = logging.getLogger(__name__)
+
+
+class SongTableModel(QAbstractTableModel):
+    """
+    Table model showing the songs of a Songbook directly, without copying them into items. The key column is filled
+    in from the song index once it has been read.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.songbook = None
+        self.infos = {}
+
+    def set_songbook(self, songbook):
+        self.beginResetModel()
+        self.songbook = songbook
+        self.infos = {}
+        self.endResetModel()
+
+    def set_infos(self, infos):
+        """
+        :param infos: A dictionary from file path to SongInfo
+        :type infos: dict
+        """
+        self.infos.update(infos)
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, KEY_COLUMN), self.index(self.rowCount() - 1, KEY_COLUMN))
+
+    def add_songs(self, songs):
+        if not songs:
+            return
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row + len(songs) - 1)
+        self.songbook.songs.extend(songs)
+        self.endInsertRows()
+
+    def remove_songs(self, songs):
+        removed = set(id(song) for song in songs)
+        self.beginResetModel()
+        self.songbook.songs = [song for song in self.songbook.songs if id(song) not in removed]
+        self.endResetModel()
+
+    def song(self, row):
+        return self.songbook.songs[row]
+
+    def text(self, song, column):
+        if column == TITLE_COLUMN:
+            return song.title
+        if column == ARTIST_COLUMN:
+            return song.artist
+        info = self.infos.get(song.file_path)
+        return info.key if info is not None else ''
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.songbook is None:
+            return 0
+        return len(self.songbook.songs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        song = self.songbook.songs[index.row()]
+        if role == Qt.DisplayRole:
+            return self.text(song, index.column())
+        if role == Qt.UserRole:
+            return song.file_path
+        if role == Qt.SizeHintRole and index.column() == TITLE_COLUMN:
+            return QSize(0, 30)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.tr(COLUMNS[section])
+        return None
+
+
+class SongFilterProxyModel(QSortFilterProxyModel):
+    """
+    Sorts and filters the song list. With search results set, songs whose lyrics or chords match the search are
+    shown along with the songs matching the filter string.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.matches = None
+
+    def set_matches(self, matches):
+        """
+        :param matches: The file paths of the songs matching the search, or None to only use the filter string
+        :type matches: set
+        """
+        self.matches = matches
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if super().filterAcceptsRow(source_row, source_parent):
+            return True
+        if self.matches is None:
+            return False
+        return self.sourceModel().song(source_row).file_path in self.matches
+
+
+class SongIndexSignals(QObject):
+    finished = pyqtSignal(int, object)
+
+
+class SongIndexJob(QRunnable):
+    """
+    Reads the song index of a project on a worker thread, which also checks which song files exist. SQLite
+    connections belong to the thread that opened them, so the job opens its own. If the index cannot be used, the
+    songs are scanned without it, so that finished is always emitted.
+    """
+    def __init__(self, generation, project_file, file_paths):
+        super().__init__()
+        self.generation = generation
+        self.project_file = project_file
+        self.file_paths = file_paths
+        self.signals = SongIndexSignals()
+
+    def run(self):
+        try:
+            song_index = SongIndex(self.project_file)
+            try:
+                infos = song_index.get_many(self.file_paths)
+            finally:
+                song_index.close()
+        except sqlite3.Error:
+            logger.exception('Could not use the song index of %s', self.project_file)
+            infos = scan_songs(self.file_paths)
+        self.signals.finished.emit(self.generation, infos)
+
+
+class SearchIndexJob(QRunnable):
+    """
+    Builds a search index of song files on a worker thread. The index is handed over to the GUI thread when done,
+    and not touched by the job after that.
+    """
+    def __init__(self, generation, file_paths):
+        super().__init__()
+        self.generation = generation
+        self.file_paths = file_paths
+        self.signals = SongIndexSignals()
+
+    def run(self):
+        search_index = SearchIndex()
+        for file_path in self.file_paths:
+            search_index.add_file(file_path)
+        self.signals.finished.emit(self.generation, search_index)
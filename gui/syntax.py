@@ -15,19 +15,21 @@
 # You should have received a copy of the GNU General Public License
 # along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt5.QtCore import QRegExp
 from PyQt5.QtGui import QColor, QTextCharFormat, QFont, QSyntaxHighlighter
 
+from gui.documentmodel import DocumentModel
+from model.chordpro import ARGUMENT_DIRECTIVES, DIRECTIVES, IN_CHORUS, IN_TAB, Chord, Directive, region_change
 
-def font_format(color, style=''):
+
+def font_format(color=None, style='', background=None):
     """
     Return a QTextCharFormat with the given attributes.
     """
-    _color = QColor()
-    _color.setNamedColor(color)
-
     _format = QTextCharFormat()
-    _format.setForeground(_color)
+    if color is not None:
+        _format.setForeground(QColor(color))
+    if background is not None:
+        _format.setBackground(QColor(background))
     if 'bold' in style:
         _format.setFontWeight(QFont.Bold)
     if 'italic' in style:
@@ -42,7 +44,8 @@ STYLES = {
     'argument': font_format('darkcyan'),
     'curlyBrace': font_format('orange'),
     'chord': font_format('firebrick'),
-    'chorus': font_format('yellow', 'bold')
+    'chorus': font_format(style='bold', background='lightyellow'),
+    'tab': font_format(background='whitesmoke')
 }
 
 
@@ -50,103 +53,71 @@ class ChordProHighlighter(QSyntaxHighlighter):
     """
     Syntax highlighter for the ChordPro language.
     """
-    # ChordPro keywords
-    keywords = [
-        'new_song', 'ns', 'start_of_chorus', 'soc', 'end_of_chorus', 'eoc', 'start_of_tab', 'sot', 'end_of_tab', 'eot',
-        'define', 'no_grid', 'ng', 'grid', 'g', 'new_page', 'np', 'new_physical_page', 'npp', 'column_break', 'colb'
-    ]
-    argumentKeywords = [
-        'title', 't', 'subtitle', 'st', 'comment', 'c', 'comment_italic', 'ci', 'comment_box', 'cb', 'textfont',
-        'textsize', 'chordfont', 'chordsize', 'titles', 'columns', 'col', 'pagetype'
-    ]
-    keywords.extend(argumentKeywords)
-
-    # Braces
-    curlyBraces = [
-        '\{', '\}',
-    ]
-    squareBraces = [
-        '\[', '\]',
-    ]
-
     def __init__(self, document):
+        # The model connects to the document first, so it is up to date when blocks are highlighted
+        self.model = DocumentModel(document)
         QSyntaxHighlighter.__init__(self, document)
 
-        self.start_of_chorus = (QRegExp("\{soc\}"), QRegExp("\{eoc\}"), 1, STYLES['chorus'])
-
-        rules = []
-
-        # Rules
         # TODO: make a nice rule for chord definition
         # TODO: make rules for keywords that take special arguments (like numbers)
-        rules += [(r'\{%s\:(.)*\}' % w, 0, STYLES['argument']) for w in ChordProHighlighter.argumentKeywords]
-        rules += [(r'\{%s\:?' % w, 0, STYLES['keyword']) for w in ChordProHighlighter.keywords]
-        rules += [(r'%s' % b, 0, STYLES['curlyBrace']) for b in ChordProHighlighter.curlyBraces]
-        rules += [(r'\[[^\]]*\]', 0, STYLES['chord'])]
-
-        # Build a QRegExp for each pattern
-        self.rules = [(QRegExp(pat), index, fmt)
-                      for (pat, index, fmt) in rules]
+        self.formats = {}
 
-    def highlightBlock(self, text):
+    def style(self, name, state):
         """
-        Apply syntax highlighting to the given block of text.
+        The format of a token inside the regions given by state, which is the token's style on top of the region's.
+        :type name: str
+        :type state: int
+        :rtype: QTextCharFormat
         """
-        # Do other syntax formatting
-        for expression, nth, fmt in self.rules:
-            index = expression.indexIn(text, 0)
-
-            while index >= 0:
-                # We actually want the index of the nth match
-                index = expression.pos(nth)
-                length = len(expression.cap(nth))
-                self.setFormat(index, length, fmt)
-                index = expression.indexIn(text, index + length)
-
-        self.setCurrentBlockState(0)
+        _format = self.formats.get((name, state))
+        if _format is None:
+            _format = QTextCharFormat()
+            if state & IN_CHORUS:
+                _format.merge(STYLES['chorus'])
+            if state & IN_TAB:
+                _format.merge(STYLES['tab'])
+            if name is not None:
+                _format.merge(STYLES[name])
+            self.formats[name, state] = _format
+        return _format
 
-        # Do multi-line strings
-        # TODO: Stop this from overriding the existing style
-        # in_multiline = self.match_multiline(text, *self.start_of_chorus)
-
-    def match_multiline(self, text, starting_delimiter, ending_delimiter, in_state, style):
+    def highlightBlock(self, text):
         """
-        Highlight multiline text between starting_delimiter and ending_delimiter
-        :param text: text to be highlighted
-        :param starting_delimiter: QRegExp for the starting delimiter
-        :param ending_delimiter: QRegExp for the ending delimiter
-        :param in_state: unique integer defining if text is between delimiters
-        :param style: the style to apply
-        :return: True if we are still inside the multi-line, False otherwise
+        Apply syntax highlighting to the given block of text, from its line in the document model. The block state
+        tells which regions the block ends in. Qt highlights the next block again only when the state of a block
+        changes, so editing inside a chorus does not rehighlight the rest of the document.
         """
-        if self.previousBlockState() == in_state:
-            start = 0
-            add = 0
-        # Otherwise, look for the delimiter on this line
-        else:
-            start = starting_delimiter.indexIn(text)
-            # Move past this match
-            add = starting_delimiter.matchedLength()
-
-        # As long as there's a delimiter match on this line...
-        while start >= 0:
-            # Look for the ending delimiter
-            end = ending_delimiter.indexIn(text, start + add)
-            # Ending delimiter on this line?
-            if end >= add:
-                length = end - start + add + ending_delimiter.matchedLength()
-                self.setCurrentBlockState(0)
-            # No; multi-line string
+        state = max(self.previousBlockState(), 0)
+        block = self.currentBlock()
+        line = self.model.line(block.blockNumber(), text, state)
+        length = block.length()
+        utf16 = line.utf16
+        if state:
+            self.setFormat(0, length, self.style(None, state))
+        for token in line.tokens:
+            start = utf16(token.start)
+            if type(token) is Chord:
+                self.setFormat(start, utf16(token.end) - start, self.style('chord', state))
+            elif type(token) is Directive:
+                end = utf16(token.end)
+                closing = line.text[token.end - 1] == '}'
+                region, starts = region_change(token)
+                if starts:
+                    state |= region
+                    self.setFormat(start, length - start, self.style(None, state))
+                if token.name in ARGUMENT_DIRECTIVES and token.argument_start >= 0:
+                    argument_start = utf16(token.argument_start)
+                    self.setFormat(argument_start, utf16(token.argument_end) - argument_start,
+                                   self.style('argument', state))
+                self.setFormat(start, 1, self.style('curlyBrace', state))
+                if token.name in DIRECTIVES:
+                    self.setFormat(start + 1, end - start - 1 - closing, self.style('keyword', state))
+                if closing:
+                    self.setFormat(end - 1, 1, self.style('curlyBrace', state))
+                if region and not starts:
+                    state &= ~region
+                    self.setFormat(end, length - end, self.style(None, state))
             else:
-                self.setCurrentBlockState(in_state)
-                length = len(text) - start + add
-                # Apply formatting
-            self.setFormat(start, length, style)
-            # Look for the next match
-            start = starting_delimiter.indexIn(text, start + length)
+                self.setFormat(start, 1, self.style('curlyBrace', state))
 
-        # Return True if still inside a multi-line string, False otherwise
-        if self.currentBlockState() == in_state:
-            return True
-        else:
-            return False
+        self.setCurrentBlockState(state)
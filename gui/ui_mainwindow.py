@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'gui/qtchordii/mainwindow.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        MainWindow.setObjectName("MainWindow")
+        MainWindow.resize(1600, 800)
+        self.centralWidget = QtWidgets.QWidget(MainWindow)
+        self.centralWidget.setObjectName("centralWidget")
+        self.gridLayout = QtWidgets.QGridLayout(self.centralWidget)
+        self.gridLayout.setContentsMargins(11, 11, 11, 11)
+        self.gridLayout.setSpacing(6)
+        self.gridLayout.setObjectName("gridLayout")
+        self.splitter = QtWidgets.QSplitter(self.centralWidget)
+        self.splitter.setOrientation(QtCore.Qt.Horizontal)
+        self.splitter.setObjectName("splitter")
+        self.songListWidget = QtWidgets.QWidget(self.splitter)
+        self.songListWidget.setObjectName("songListWidget")
+        self.songListLayout = QtWidgets.QVBoxLayout(self.songListWidget)
+        self.songListLayout.setContentsMargins(0, 0, 0, 0)
+        self.songListLayout.setSpacing(6)
+        self.songListLayout.setObjectName("songListLayout")
+        self.filterEdit = QtWidgets.QLineEdit(self.songListWidget)
+        self.filterEdit.setClearButtonEnabled(True)
+        self.filterEdit.setObjectName("filterEdit")
+        self.songListLayout.addWidget(self.filterEdit)
+        self.fileWidget = QtWidgets.QTableView(self.songListWidget)
+        self.fileWidget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.fileWidget.setAlternatingRowColors(True)
+        self.fileWidget.setSelectionMode(QtWidgets.QAbstractItemView.ContiguousSelection)
+        self.fileWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.fileWidget.setSortingEnabled(True)
+        self.fileWidget.setObjectName("fileWidget")
+        self.fileWidget.horizontalHeader().setStretchLastSection(True)
+        self.fileWidget.verticalHeader().setVisible(False)
+        self.songListLayout.addWidget(self.fileWidget)
+        self.textEdit = CustomTextEdit(self.splitter)
+        self.textEdit.setStyleSheet("font: 9pt \"DejaVu Sans Mono\";")
+        self.textEdit.setObjectName("textEdit")
+        self.scrollArea = PDFViewer(self.splitter)
+        self.scrollArea.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAsNeeded)
+        self.scrollArea.setWidgetResizable(True)
+        self.scrollArea.setAlignment(QtCore.Qt.AlignCenter)
+        self.scrollArea.setObjectName("scrollArea")
+        self.gridLayout.addWidget(self.splitter, 0, 0, 1, 1)
+        MainWindow.setCentralWidget(self.centralWidget)
+        self.menuBar = QtWidgets.QMenuBar(MainWindow)
+        self.menuBar.setGeometry(QtCore.QRect(0, 0, 1600, 30))
+        self.menuBar.setObjectName("menuBar")
+        self.menuTr_File = QtWidgets.QMenu(self.menuBar)
+        self.menuTr_File.setObjectName("menuTr_File")
+        self.menuView = QtWidgets.QMenu(self.menuBar)
+        self.menuView.setObjectName("menuView")
+        MainWindow.setMenuBar(self.menuBar)
+        self.mainToolBar = QtWidgets.QToolBar(MainWindow)
+        self.mainToolBar.setObjectName("mainToolBar")
+        MainWindow.addToolBar(QtCore.Qt.TopToolBarArea, self.mainToolBar)
+        self.statusBar = QtWidgets.QStatusBar(MainWindow)
+        self.statusBar.setObjectName("statusBar")
+        MainWindow.setStatusBar(self.statusBar)
+        self.actionNew = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("document-new")
+        self.actionNew.setIcon(icon)
+        self.actionNew.setObjectName("actionNew")
+        self.actionImport = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("document-import")
+        self.actionImport.setIcon(icon)
+        self.actionImport.setObjectName("actionImport")
+        self.actionSave = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("document-save")
+        self.actionSave.setIcon(icon)
+        self.actionSave.setObjectName("actionSave")
+        self.actionPreview = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("media-playback-start")
+        self.actionPreview.setIcon(icon)
+        self.actionPreview.setObjectName("actionPreview")
+        self.actionSave_As = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("document-save-as")
+        self.actionSave_As.setIcon(icon)
+        self.actionSave_As.setObjectName("actionSave_As")
+        self.actionLoad_Project = QtWidgets.QAction(MainWindow)
+        self.actionLoad_Project.setObjectName("actionLoad_Project")
+        self.actionSave_Project = QtWidgets.QAction(MainWindow)
+        self.actionSave_Project.setObjectName("actionSave_Project")
+        self.actionCompile_Songbook = QtWidgets.QAction(MainWindow)
+        self.actionCompile_Songbook.setObjectName("actionCompile_Songbook")
+        self.actionIncremental_Build = QtWidgets.QAction(MainWindow)
+        self.actionIncremental_Build.setCheckable(True)
+        self.actionIncremental_Build.setObjectName("actionIncremental_Build")
+        self.actionParallel_Build = QtWidgets.QAction(MainWindow)
+        self.actionParallel_Build.setCheckable(True)
+        self.actionParallel_Build.setObjectName("actionParallel_Build")
+        self.actionBuild_Cache = QtWidgets.QAction(MainWindow)
+        self.actionBuild_Cache.setObjectName("actionBuild_Cache")
+        self.actionExport_Timings = QtWidgets.QAction(MainWindow)
+        self.actionExport_Timings.setObjectName("actionExport_Timings")
+        self.actionZoom_In = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("zoom-in")
+        self.actionZoom_In.setIcon(icon)
+        self.actionZoom_In.setObjectName("actionZoom_In")
+        self.actionZoom_Out = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("zoom-out")
+        self.actionZoom_Out.setIcon(icon)
+        self.actionZoom_Out.setObjectName("actionZoom_Out")
+        self.actionFit_Width = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("zoom-fit-width")
+        self.actionFit_Width.setIcon(icon)
+        self.actionFit_Width.setObjectName("actionFit_Width")
+        self.actionExit = QtWidgets.QAction(MainWindow)
+        icon = QtGui.QIcon.fromTheme("application-exit")
+        self.actionExit.setIcon(icon)
+        self.actionExit.setObjectName("actionExit")
+        self.menuTr_File.addAction(self.actionNew)
+        self.menuTr_File.addAction(self.actionImport)
+        self.menuTr_File.addAction(self.actionSave)
+        self.menuTr_File.addAction(self.actionSave_As)
+        self.menuTr_File.addSeparator()
+        self.menuTr_File.addAction(self.actionLoad_Project)
+        self.menuTr_File.addAction(self.actionSave_Project)
+        self.menuTr_File.addSeparator()
+        self.menuTr_File.addAction(self.actionPreview)
+        self.menuTr_File.addAction(self.actionCompile_Songbook)
+        self.menuTr_File.addAction(self.actionIncremental_Build)
+        self.menuTr_File.addAction(self.actionParallel_Build)
+        self.menuTr_File.addAction(self.actionBuild_Cache)
+        self.menuTr_File.addAction(self.actionExport_Timings)
+        self.menuTr_File.addSeparator()
+        self.menuTr_File.addAction(self.actionExit)
+        self.menuView.addAction(self.actionZoom_In)
+        self.menuView.addAction(self.actionZoom_Out)
+        self.menuView.addAction(self.actionFit_Width)
+        self.menuBar.addAction(self.menuTr_File.menuAction())
+        self.menuBar.addAction(self.menuView.menuAction())
+        self.mainToolBar.addAction(self.actionNew)
+        self.mainToolBar.addAction(self.actionImport)
+        self.mainToolBar.addAction(self.actionSave)
+        self.mainToolBar.addSeparator()
+        self.mainToolBar.addAction(self.actionPreview)
+
+        self.retranslateUi(MainWindow)
+        QtCore.QMetaObject.connectSlotsByName(MainWindow)
+
+    def retranslateUi(self, MainWindow):
+        _translate = QtCore.QCoreApplication.translate
+        MainWindow.setWindowTitle(_translate("MainWindow", "QtChordii"))
+        self.filterEdit.setPlaceholderText(_translate("MainWindow", "Filter songs"))
+        self.menuTr_File.setTitle(_translate("MainWindow", "&File"))
+        self.menuView.setTitle(_translate("MainWindow", "&View"))
+        self.actionNew.setText(_translate("MainWindow", "&New"))
+        self.actionNew.setToolTip(_translate("MainWindow", "New Song"))
+        self.actionImport.setText(_translate("MainWindow", "&Import..."))
+        self.actionImport.setToolTip(_translate("MainWindow", "Import Chordpro files"))
+        self.actionSave.setText(_translate("MainWindow", "&Save"))
+        self.actionSave.setToolTip(_translate("MainWindow", "Save Song"))
+        self.actionPreview.setText(_translate("MainWindow", "&Preview"))
+        self.actionPreview.setToolTip(_translate("MainWindow", "Run Chordii and show preview"))
+        self.actionPreview.setShortcut(_translate("MainWindow", "Ctrl+R"))
+        self.actionSave_As.setText(_translate("MainWindow", "Save &As..."))
+        self.actionSave_As.setToolTip(_translate("MainWindow", "Save a copy of the song"))
+        self.actionLoad_Project.setText(_translate("MainWindow", "&Load Project"))
+        self.actionSave_Project.setText(_translate("MainWindow", "Sa&ve Project"))
+        self.actionCompile_Songbook.setText(_translate("MainWindow", "&Compile Songbook"))
+        self.actionIncremental_Build.setText(_translate("MainWindow", "&Incremental Build"))
+        self.actionIncremental_Build.setToolTip(_translate("MainWindow", "Only recompile songs that changed since the last build"))
+        self.actionParallel_Build.setText(_translate("MainWindow", "P&arallel Build"))
+        self.actionParallel_Build.setToolTip(_translate("MainWindow", "Compile the songbook on several processor cores"))
+        self.actionBuild_Cache.setText(_translate("MainWindow", "Build &Cache..."))
+        self.actionExport_Timings.setText(_translate("MainWindow", "Export &Timings..."))
+        self.actionExport_Timings.setToolTip(_translate("MainWindow", "Save the timings of the compiles and previews of this session as a Chrome trace"))
+        self.actionZoom_In.setText(_translate("MainWindow", "Zoom &In"))
+        self.actionZoom_Out.setText(_translate("MainWindow", "Zoom &Out"))
+        self.actionFit_Width.setText(_translate("MainWindow", "Fit &Width"))
+        self.actionFit_Width.setShortcut(_translate("MainWindow", "Ctrl+0"))
+        self.actionExit.setText(_translate("MainWindow", "E&xit"))
+from gui.customtextedit import CustomTextEdit
+from gui.pdfviewer import PDFViewer
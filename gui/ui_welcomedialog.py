@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'gui/qtchordii/welcomedialog.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_welcome(object):
+    def setupUi(self, welcome):
+        welcome.setObjectName("welcome")
+        welcome.resize(450, 150)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(welcome.sizePolicy().hasHeightForWidth())
+        welcome.setSizePolicy(sizePolicy)
+        welcome.setModal(True)
+        self.gridLayout = QtWidgets.QGridLayout(welcome)
+        self.gridLayout.setObjectName("gridLayout")
+        self.new_project_btn = QtWidgets.QPushButton(welcome)
+        self.new_project_btn.setMinimumSize(QtCore.QSize(0, 50))
+        self.new_project_btn.setObjectName("new_project_btn")
+        self.gridLayout.addWidget(self.new_project_btn, 1, 0, 1, 1)
+        self.open_project_btn = QtWidgets.QPushButton(welcome)
+        self.open_project_btn.setMinimumSize(QtCore.QSize(0, 50))
+        self.open_project_btn.setObjectName("open_project_btn")
+        self.gridLayout.addWidget(self.open_project_btn, 1, 1, 1, 1)
+        self.welcome_label = QtWidgets.QLabel(welcome)
+        self.welcome_label.setObjectName("welcome_label")
+        self.gridLayout.addWidget(self.welcome_label, 0, 0, 1, 2)
+
+        self.retranslateUi(welcome)
+        QtCore.QMetaObject.connectSlotsByName(welcome)
+
+    def retranslateUi(self, welcome):
+        _translate = QtCore.QCoreApplication.translate
+        welcome.setWindowTitle(_translate("welcome", "QtChordii"))
+        self.new_project_btn.setText(_translate("welcome", "New project..."))
+        self.open_project_btn.setText(_translate("welcome", "Open project..."))
+        self.welcome_label.setText(_translate("welcome", "TextLabel"))
@@ -0,0 +1,49 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import importlib
+import os
+
+UI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'qtchordii')
+
+
+def setup_ui(widget, name, class_name):
+    """
+    Create the widgets of a form on widget. The form is built by the module pyuic5 generated from its .ui file, e.g.
+    gui/ui_mainwindow.py for gui/qtchordii/mainwindow.ui, which is much faster than parsing the .ui file at start-up.
+    Without the generated module, the .ui file is loaded with uic.
+
+    After changing a .ui file, regenerate its module with e.g.
+
+        $ pyuic5 gui/qtchordii/mainwindow.ui -o gui/ui_mainwindow.py
+
+    :param widget: The widget to set up
+    :type widget: QWidget
+    :param name: The name of the form, e.g. 'mainwindow'
+    :type name: str
+    :param class_name: The name of the form class in the generated module, e.g. 'Ui_MainWindow'
+    :type class_name: str
+    :return: An object with the widgets of the form as attributes
+    """
+    try:
+        module = importlib.import_module('gui.ui_' + name)
+    except ImportError:
+        from PyQt5 import uic
+        return uic.loadUi(os.path.join(UI_DIR, name + '.ui'), widget)
+    ui = getattr(module, class_name)()
+    ui.setupUi(widget)
+    return ui
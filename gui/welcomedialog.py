@@ -17,15 +17,16 @@
 # You should have received a copy of the GNU General Public License
 # along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt5 import uic
 from PyQt5.QtCore import QDir
 from PyQt5.QtWidgets import QDialog, QLayout, QFileDialog, QDesktopWidget
 
+from gui.uiloader import setup_ui
+
 
 class WelcomeDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.ui = uic.loadUi('gui/qtchordii/welcomedialog.ui', self)
+        self.ui = setup_ui(self, 'welcomedialog', 'Ui_welcome')
 
         self.ui.new_project_btn.clicked.connect(self.new_project)
         self.ui.open_project_btn.clicked.connect(self.open_project)
@@ -35,7 +36,7 @@ class WelcomeDialog(QDialog):
         self.ui.welcome_label.setText(
                 self.tr("Welcome to QtChordii!\nPlease create a new songbook project, or load an existing one."))
 
-        self.ui.layout().setSizeConstraint(QLayout.SetFixedSize)
+        self.layout().setSizeConstraint(QLayout.SetFixedSize)
 
         self.center()
 
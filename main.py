@@ -17,43 +17,74 @@
 # You should have received a copy of the GNU General Public License
 # along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
+
+# Taken before the other imports, so that --startup-trace can tell how long they take
+STARTED = time.perf_counter()
+
 import argparse
 import codecs
 import os
-import re
 import shutil
-import subprocess
 import sys
-import tempfile
-
-from PyQt5 import uic
-from PyQt5.QtCore import Qt, QDir, QSize, QT_TRANSLATE_NOOP
-from PyQt5.QtGui import QKeySequence
-from PyQt5.QtWidgets import QApplication, qApp, QMessageBox, QFileDialog, QMainWindow, QDesktopWidget, QTableWidgetItem
-
+from collections import OrderedDict
+from functools import partial
+
+from PyQt5.QtCore import Qt, QDir, QThreadPool, QTimer, QT_TRANSLATE_NOOP
+from PyQt5.QtGui import QKeySequence, QTextCursor
+from PyQt5.QtWidgets import (QApplication, qApp, QMessageBox, QFileDialog, QMainWindow, QDesktopWidget, QProgressDialog,
+                             QLabel)
+
+from gui.compilescheduler import BUILD, PREFETCH, PREVIEW, CompileScheduler, song_key
+from gui.songimporter import SongImporter
+from gui.songtablemodel import SongTableModel, SongFilterProxyModel, SongIndexJob, SearchIndexJob
+from gui.uiloader import setup_ui
 from gui.warningmessagebox import WarningMessageBox
 from gui.welcomedialog import WelcomeDialog
+from model.searchindex import SearchIndex
+from model.song import Song
 from model.songbook import Songbook
 from settings import settings
-from tab2chordpro.Transpose import testTabFormat, tab2ChordPro, enNotation
-from utils.ps2pdf import ps2pdf
-from utils.which import which
+from utils.build import build_incremental, build_songbook
+from utils.chordii import SONG_ENCODING, ChordiiError, compile_text, scratch_dir
+from utils.compilecache import CompileCache
+from utils.ps2pdf import Ps2PdfError
+from utils.timing import Timings, stage
+from utils.toolchain import GS, Toolchain
 
 CHORDPRO_FILTER = QT_TRANSLATE_NOOP('MainWindow', 'ChordPro files (*.cho *.crd)')
+PREVIEW_DELAY = 500
+# The songs around the selected one in fileWidget that are compiled in the background, nearest first
+PREFETCH_OFFSETS = (1, -1, 2)
+# The stages whose latest timings are shown in the status bar
+STATUS_STAGES = ('chordii', 'ps2pdf', 'load', 'render')
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, args, startup=None):
+        """
+        :param args: The command line arguments
+        :param startup: Timings to record the start-up phases in, or None
+        :type startup: Timings
+        """
         super().__init__()
-        self.ui = uic.loadUi('gui/qtchordii/mainwindow.ui', self)
+        with stage(startup, 'ui'):
+            self.ui = setup_ui(self, 'mainwindow', 'Ui_MainWindow')
 
         settings.set_up_settings()
         self.app_name = settings.APPLICATION_NAME
 
-        args = parse_arguments()
-
         self.file_name = None
         self.songbook = Songbook()
+        self.compile_cache = None
+        self.index_generation = 0
+        self.search_index = SearchIndex()
+        self.search_updates = None
+        self.importer = None
+        self.imported_paths = []
+        self.tools = None
+        self.tools_missing = False
+        self.timings = Timings()
         if args.project:
             self.project_file = os.path.abspath(args.project)
         else:
@@ -65,14 +96,19 @@ class MainWindow(QMainWindow):
                 if new_file:
                     self.save_project()
 
-        self.load_project(self.project_file)
+        # The songs are listed right away, and their files are checked in the background
+        with stage(startup, 'project'):
+            self.setup_file_widget()
+            self.load_project(self.project_file)
 
-        self.temp_dir = tempfile.mkdtemp()
+        self.temp_dir = scratch_dir()
 
-        self.setup_file_widget()
-        self.setup_editor()
-        self.setup_file_menu()
-        self.setup_geometry()
+        with stage(startup, 'setup'):
+            self.setup_preview()
+            self.setup_editor()
+            self.setup_file_menu()
+            self.setup_view_menu()
+            self.setup_geometry()
         self.dirty = False
 
     def setup_file_menu(self):
@@ -104,18 +140,71 @@ class MainWindow(QMainWindow):
         compile_songbook_act = self.ui.actionCompile_Songbook
         compile_songbook_act.triggered.connect(self.run_chordii)
 
+        build_settings = settings.load_build_settings()
+        incremental_build_act = self.ui.actionIncremental_Build
+        incremental_build_act.setChecked(build_settings[settings.key_incremental_build])
+        incremental_build_act.toggled.connect(self.save_build_settings)
+
+        parallel_build_act = self.ui.actionParallel_Build
+        parallel_build_act.setChecked(build_settings[settings.key_parallel_build])
+        parallel_build_act.toggled.connect(self.save_build_settings)
+
+        build_cache_act = self.ui.actionBuild_Cache
+        build_cache_act.triggered.connect(self.show_build_cache)
+
+        export_timings_act = self.ui.actionExport_Timings
+        export_timings_act.triggered.connect(self.export_timings)
+
         exit_act = self.ui.actionExit
         exit_act.setShortcut(QKeySequence.Quit)
         exit_act.triggered.connect(qApp.quit)
 
+    def setup_view_menu(self):
+        zoom_in_act = self.ui.actionZoom_In
+        zoom_in_act.setShortcut(QKeySequence.ZoomIn)
+        zoom_in_act.triggered.connect(self.ui.scrollArea.zoom_in)
+
+        zoom_out_act = self.ui.actionZoom_Out
+        zoom_out_act.setShortcut(QKeySequence.ZoomOut)
+        zoom_out_act.triggered.connect(self.ui.scrollArea.zoom_out)
+
+        fit_width_act = self.ui.actionFit_Width
+        fit_width_act.triggered.connect(self.ui.scrollArea.zoom_to_fit)
+
     def setup_file_widget(self):
+        self.song_model = SongTableModel(self)
+        self.song_proxy = SongFilterProxyModel(self)
+        self.song_proxy.setSourceModel(self.song_model)
+        self.song_proxy.setFilterKeyColumn(-1)
+        self.song_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.ui.fileWidget.setModel(self.song_proxy)
         # TODO: Fix this
         # self.ui.fileWidget.resizeColumnsToContents()
-        self.ui.fileWidget.itemSelectionChanged.connect(self.selection_changed)
+        self.ui.fileWidget.selectionModel().selectionChanged.connect(self.selection_changed)
+        self.ui.filterEdit.textChanged.connect(self.filter_songs)
 
     def setup_editor(self):
         self.ui.textEdit.set_main(self)
         self.ui.textEdit.textChanged.connect(self.set_dirty)
+        self.ui.textEdit.textChanged.connect(self.schedule_preview)
+
+    def setup_preview(self):
+        self.compile_scheduler = CompileScheduler(self)
+        self.compile_scheduler.finished.connect(self.compile_finished)
+        self.compile_scheduler.failed.connect(self.compile_failed)
+        self.preview_key = None
+        self.ui.scrollArea.timings = self.timings
+        self.ui.scrollArea.page_ready.connect(self.show_timings)
+        self.timings_label = QLabel(self)
+        self.ui.statusBar.addPermanentWidget(self.timings_label)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY)
+        self.preview_timer.timeout.connect(self.update_preview)
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(PREVIEW_DELAY)
+        self.prefetch_timer.timeout.connect(self.prefetch_songs)
 
     def setup_geometry(self):
         geometries = settings.load_window_geometry()
@@ -131,8 +220,8 @@ class MainWindow(QMainWindow):
         splitter_sizes = geometries[settings.key_splitter_sizes]
         if not splitter_sizes:
             width = size.width()
-            splitter_size = width * .2
-            splitter_sizes = [splitter_size, (width - splitter_size) / 2, (width - splitter_size) / 2]
+            splitter_size = int(width * .2)
+            splitter_sizes = [splitter_size, (width - splitter_size) // 2, (width - splitter_size) // 2]
         self.ui.splitter.setSizes(splitter_sizes)
 
         pos = geometries[settings.key_pos]
@@ -143,10 +232,21 @@ class MainWindow(QMainWindow):
             pos = geometry.topLeft()
         self.move(pos)
 
+    def filter_songs(self):
+        """
+        Show the songs whose title, artist or key contains the filter text, or whose lyrics and chords match it as a
+        search query.
+        """
+        text = self.ui.filterEdit.text()
+        self.song_proxy.setFilterFixedString(text)
+        self.song_proxy.set_matches(self.search_index.search(text))
+
     def selection_changed(self):
-        if len(self.ui.fileWidget.selectedItems()) == 2:
+        rows = self.ui.fileWidget.selectionModel().selectedRows()
+        if len(rows) == 1:
             if self.ok_to_continue():
-                self.open_file(self.ui.fileWidget.selectedItems()[0].data(Qt.UserRole))
+                self.open_file(rows[0].data(Qt.UserRole))
+                self.prefetch_timer.start()
 
     def closeEvent(self, event):
         """
@@ -154,6 +254,12 @@ class MainWindow(QMainWindow):
         """
         if self.ok_to_continue():
             settings.save_window_geometry(self.size(), self.pos(), self.isFullScreen(), self.ui.splitter.sizes())
+            self.preview_timer.stop()
+            self.prefetch_timer.stop()
+            self.compile_scheduler.wait()
+            if self.importer is not None:
+                self.importer.finished.disconnect(self.index_imported_songs)
+                self.importer.cancel()
             shutil.rmtree(self.temp_dir)
             event.accept()
         else:
@@ -220,7 +326,7 @@ class MainWindow(QMainWindow):
         self.file_name = path
 
         if self.file_name:
-            in_stream = codecs.open(self.file_name, "r", "ISO-8859-1")
+            in_stream = codecs.open(self.file_name, "r", SONG_ENCODING)
             if in_stream:
                 self.ui.textEdit.setPlainText(in_stream.read())
         self.clear_dirty()
@@ -231,10 +337,103 @@ class MainWindow(QMainWindow):
         self.tab2chordpro()
 
     def update_preview(self):
+        """
+        Compile the text in textEdit in the background, replacing any preview that is still being compiled. A preview
+        of the same text that is already compiled, e.g. prefetched, is shown right away.
+        """
+        self.preview_timer.stop()
+        if self.file_name:
+            tools = self.find_tools(ask=False)
+            if not tools:
+                return
+            text = self.ui.textEdit.toPlainText()
+            self.preview_key = song_key(self.file_name, text)
+            self.compile_scheduler.drop(PREVIEW, keep=(self.preview_key,))
+            self.compile_scheduler.submit(self.preview_key, PREVIEW, self.compile_song(self.file_name, text))
+
+    def prefetch_songs(self):
+        """
+        Compile the songs next to the selected one in fileWidget in the background, so that their previews can be
+        shown right away if they are selected next.
+        """
+        current = self.ui.fileWidget.currentIndex()
+        if not self.tools or not current.isValid():
+            return
+        requests = OrderedDict()
+        for offset in PREFETCH_OFFSETS:
+            index = current.sibling(current.row() + offset, 0)
+            if not index.isValid():
+                continue
+            file_path = index.data(Qt.UserRole)
+            try:
+                with codecs.open(file_path, "r", SONG_ENCODING) as f:
+                    text = f.read()
+            except OSError:
+                continue
+            requests[song_key(file_path, text)] = self.compile_song(file_path, text)
+        self.compile_scheduler.drop(PREFETCH, keep=requests)
+        for key, work in requests.items():
+            self.compile_scheduler.submit(key, PREFETCH, work)
+
+    def compile_song(self, file_name, text):
+        """
+        :return: The work of compiling a song to PDF, for compile_scheduler
+        :rtype: callable
+        """
+        chordii_command, gs_command = self.tools
+        return partial(compile_text, chordii_command, text, os.path.splitext(os.path.basename(file_name))[0],
+                       self.temp_dir, gs_command=gs_command, timings=self.timings)
+
+    def show_timings(self):
+        """
+        Show the latest timings of compiling and showing a song in the status bar.
+        """
+        self.timings_label.setText(self.timings.summary(STATUS_STAGES))
+
+    def export_timings(self):
+        filename = QFileDialog.getSaveFileName(self, self.tr("Export timings"),
+                                               os.path.join(QDir.homePath(), 'qtchordii-trace.json'),
+                                               self.tr("Chrome trace files (*.json)"))[0]
+        if filename:
+            try:
+                self.timings.save_trace(filename)
+            except OSError as e:
+                QMessageBox.critical(self, self.tr(self.app_name + " - Export timings"),
+                                     self.tr("Couldn't save the timings: ") + str(e))
+                return
+            self.ui.statusBar.showMessage(self.tr("Timings saved. Open them in chrome://tracing."), 5000)
+
+    def compile_finished(self, key, result):
+        self.show_timings()
+        if key == self.preview_key:
+            pdf, warnings = result
+            self.show_preview(pdf)
+            if warnings:
+                self.ui.statusBar.showMessage(self.tr('Preview warning: ') + warnings.splitlines()[0], 5000)
+        elif key[0] == BUILD:
+            self.build_finished(*result)
+
+    def compile_failed(self, key, error):
+        if key == self.preview_key:
+            if isinstance(error, Ps2PdfError):
+                # The last line of the Ghostscript output usually says what went wrong
+                lines = error.output.strip().splitlines()
+                message = self.tr("Ghostscript could not convert the song to PDF") + (': ' + lines[-1] if lines else '')
+            else:
+                message = str(error)
+            self.ui.statusBar.showMessage(self.tr('Preview failed: ') + message, 5000)
+        elif key[0] == BUILD:
+            self.build_failed(error)
+
+    def schedule_preview(self):
+        """
+        Update the preview once the user has stopped typing for PREVIEW_DELAY milliseconds.
+        """
         if self.file_name:
-            out_file = os.path.join(self.temp_dir, os.path.splitext(os.path.basename(self.file_name))[0])
-            out_file = self.run_chordii(self.file_name, out_file, True)
-            self.ui.scrollArea.load(out_file)
+            self.preview_timer.start()
+
+    def show_preview(self, pdf):
+        self.ui.scrollArea.load_data(pdf)
 
     def save_file(self):
         """
@@ -246,11 +445,16 @@ class MainWindow(QMainWindow):
             if not self.dirty:
                 return
             fname = self.file_name
-            fl = codecs.open(fname, 'w', "ISO-8859-1")
+            fl = codecs.open(fname, 'w', SONG_ENCODING)
             temp_text = self.ui.textEdit.toPlainText()
             if temp_text:
                 fl.write(temp_text)
                 fl.close()
+                self.search_index.add(fname, temp_text)
+                if self.search_updates is not None:
+                    self.search_updates[fname] = temp_text
+                if self.ui.filterEdit.text():
+                    self.filter_songs()
                 self.clear_dirty()
                 self.update_status('Saved file')
                 return True
@@ -279,45 +483,106 @@ class MainWindow(QMainWindow):
                                                   self.tr(CHORDPRO_FILTER))[0]
         if not file_paths:
             return
-        title_regex = re.compile(r'\{(?:t|title):(.+)\}')
-        artist_regex = re.compile(r'\{(?:st|subtitle):(.+)\}')
-        for file_path in file_paths:
-            unknown = self.tr('Unknown')
-            title = artist = unknown
-            for line in open(file_path, 'r', encoding='ISO-8859-1'):
-                match = title_regex.match(line)
-                if match:
-                    title = match.group(1).strip()
-                match = artist_regex.match(line)
-                if match:
-                    artist = match.group(1).strip()
-                if unknown not in (title, artist):
-                    break
-            self.songbook.add_song(title, artist, file_path)
-        self.open_project()
+        progress = QProgressDialog(self.tr("Importing songs..."), self.tr("Cancel"), 0, len(file_paths), self)
+        progress.setWindowModality(Qt.WindowModal)
+        self.importer = SongImporter(self)
+        self.imported_paths = []
+        self.importer.songs_read.connect(self.add_imported_songs)
+        self.importer.progress.connect(lambda done, total: progress.setValue(done))
+        self.importer.finished.connect(progress.reset)
+        self.importer.finished.connect(self.index_imported_songs)
+        self.importer.finished.connect(lambda: self.ui.statusBar.showMessage("Songs imported.", 5000))
+        progress.canceled.connect(self.importer.cancel)
+        self.importer.start(file_paths)
+
+    def add_imported_songs(self, songs):
+        """
+        Add a batch of imported songs to the project.
+        :param songs: (title, artist, file path) for each song
+        :type songs: list
+        """
+        unknown = self.tr('Unknown')
+        self.song_model.add_songs([Song(title or unknown, artist or unknown, file_path)
+                                   for title, artist, file_path in songs])
+        self.imported_paths.extend(file_path for _, _, file_path in songs)
+
+    def index_imported_songs(self):
+        """
+        Index the songs of a finished import with one job each for the song and search indexes, rather than a job per
+        batch.
+        """
+        file_paths, self.imported_paths = self.imported_paths, []
+        if not file_paths:
+            return
+        job = SongIndexJob(self.index_generation, self.project_file, file_paths)
+        job.signals.finished.connect(self.song_index_imported)
+        QThreadPool.globalInstance().start(job)
+        job = SearchIndexJob(self.index_generation, file_paths)
+        job.signals.finished.connect(self.search_index_imported)
+        QThreadPool.globalInstance().start(job)
 
     def select_project(self):
         filename = QFileDialog.getOpenFileName(self, self.tr("Open project"), QDir.homePath(),
-                                               self.tr("Chordii project files (*.chproj)"))
+                                               self.tr("Chordii project files (*.chproj)"))[0]
         if filename:
             self.load_project(filename)
 
     def load_project(self, filename):
+        self.project_file = filename
+        self.compile_cache = None
         self.songbook = Songbook()
         self.songbook.load(filename)
         self.open_project()
         settings.save_project_file(filename)
 
     def open_project(self):
-        self.ui.fileWidget.clearContents()
-        missing_songs = []
-        for song in self.songbook.songs:
-            if not os.path.isfile(song.file_path):
-                missing_songs.append(song)
-                self.songbook.songs.remove(song)
-                continue
-            self.add_song(song.title, song.artist, song.file_path)
+        """
+        Show the songs of the project, and read the song index in the background. Songs whose files are missing are
+        removed once the index has been read.
+        """
+        self.song_model.set_songbook(self.songbook)
+        self.index_generation += 1
+        job = SongIndexJob(self.index_generation, self.project_file,
+                           [song.file_path for song in self.songbook.songs])
+        job.signals.finished.connect(self.song_index_read)
+        QThreadPool.globalInstance().start(job)
+        self.search_index = SearchIndex()
+        self.search_updates = {}
+        job = SearchIndexJob(self.index_generation, [song.file_path for song in self.songbook.songs])
+        job.signals.finished.connect(self.search_index_read)
+        QThreadPool.globalInstance().start(job)
+        self.ui.statusBar.showMessage("Project opened.", 5000)
+
+    def search_index_read(self, generation, search_index):
+        """
+        Use the search index built for the project, with the songs saved while it was being built.
+        """
+        if generation != self.index_generation:
+            return
+        for file_path, text in self.search_updates.items():
+            search_index.add(file_path, text)
+        self.search_updates = None
+        self.search_index = search_index
+        self.filter_songs()
+
+    def search_index_imported(self, generation, search_index):
+        if generation != self.index_generation:
+            return
+        self.search_index.merge(search_index)
+        self.filter_songs()
+
+    def song_index_imported(self, generation, infos):
+        if generation != self.index_generation:
+            return
+        self.song_model.set_infos(infos)
+
+    def song_index_read(self, generation, infos):
+        if generation != self.index_generation:
+            return
+        self.song_model.set_infos(infos)
+        missing_songs = [song for song in self.songbook.songs if infos.get(song.file_path, True) is None]
         if missing_songs:
+            self.song_model.remove_songs(missing_songs)
             message_box = QMessageBox(QMessageBox.Warning, self.tr('Missing files'),
                                       self.tr('The following project files were missing:'), QMessageBox.Ok, self)
             message_box.setInformativeText('<ul>' +
@@ -326,17 +591,6 @@ class MainWindow(QMainWindow):
                                                     for song in missing_songs]) + '</ul>')
             message_box.setIcon(QMessageBox.Warning)
             message_box.show()
-        self.ui.statusBar.showMessage("Project opened.", 5000)
-
-    def add_song(self, song_title, song_artist, song_path):
-        title = QTableWidgetItem(song_title)
-        title.setData(Qt.UserRole, song_path)
-        title.setSizeHint(QSize(0, 30))
-        artist = QTableWidgetItem(song_artist)
-        row = self.ui.fileWidget.rowCount()
-        self.ui.fileWidget.insertRow(row)
-        self.ui.fileWidget.setItem(row, 0, title)
-        self.ui.fileWidget.setItem(row, 1, artist)
 
     def save_project(self):
         """
@@ -346,89 +600,220 @@ class MainWindow(QMainWindow):
             self.songbook.save(self.project_file)
         self.ui.statusBar.showMessage("Project saved.", 5000)
 
-    def run_chordii(self, input_file=None, output_file=None, preview=False):
+    def find_tools(self, ask=True):
         """
-        Run Chordii to produce output.
-        :param input_file: The name of the ChordPro file to compile. If None, all chordii files in the project will be
-            compiled.
-        :type input_file: str
-        :param output_file: The filename of the resulting pdf. If None, a temp file will be created.
-        :type output_file: str
-        :param preview: Whether to compile a single song as a preview, or the whole project.
-        :type preview: bool
+        Find chordii and Ghostscript, asking the user for chordii's location if it is not in the PATH. They are looked
+        up once, and the programs found are remembered in the settings until they change.
+        :param ask: Whether to ask the user about missing tools. Otherwise, e.g. for previews, a tool that is missing is
+            only reported in the status bar, and not looked for again until the user asks for a compile.
+        :type ask: bool
+        :return: The chordii and gs executables, or None if either of them is missing
+        :rtype: tuple
         """
-
-        chordii_command = which("chordii")
-        if chordii_command is None:
-            chordii_command = which("chordii430")
-        if chordii_command is None:
+        if self.tools:
+            return self.tools
+        if self.tools_missing and not ask:
+            return None
+        saved = settings.load_toolchain()
+        toolchain = Toolchain(saved[settings.key_search_path], saved[settings.key_tools])
+        chordii_command = toolchain.chordii()
+        if chordii_command is None and ask:
             ret = QMessageBox.critical(self, self.tr(self.app_name + " - Chordii problem"),
                                        self.tr("Couldn't find a chordii executable in the PATH. \
                                        Please specify chordii's location to continue."),
                                        QMessageBox.Open | QMessageBox.Cancel, QMessageBox.Open)
             if ret == QMessageBox.Open:
-                chordii_command = QFileDialog.getOpenFileName(self, self.tr("Specify the chordii executable"),
-                                                              QDir.homePath())[0]
-        command = [chordii_command, "-i", "-L", "-p", "1"] if not preview else [chordii_command]
-        if not output_file:
-            out_dir = os.path.join(os.path.dirname(self.project_file), "output")
-            output_file = os.path.join(out_dir, self.songbook.name)
-            if not os.path.exists(out_dir):
-                os.makedirs(out_dir)
-        if not input_file:
-            for i in range(self.ui.fileWidget.rowCount()):
-                command.append(self.ui.fileWidget.item(i, 0).data(Qt.UserRole))
+                path = QFileDialog.getOpenFileName(self, self.tr("Specify the chordii executable"),
+                                                   QDir.homePath())[0]
+                if path:
+                    toolchain.set_chordii(path)
+                    chordii_command = toolchain.chordii()
+        gs_command = toolchain.path(GS)
+        if ask and chordii_command and gs_command is None:
+            QMessageBox.critical(self, self.tr(self.app_name + " - Ghostscript problem"),
+                                 self.tr("Couldn't find Ghostscript (gs) in the PATH. It is needed to convert the "
+                                         "output of chordii to PDF."))
+        if toolchain.changed:
+            settings.save_toolchain(toolchain.search_path, toolchain.results())
+        if chordii_command and gs_command:
+            self.tools = chordii_command, gs_command
+        elif not ask:
+            self.ui.statusBar.showMessage(self.tr("No preview: chordii or Ghostscript could not be found. Compile the "
+                                                  "songbook to locate them."), 5000)
+        self.tools_missing = self.tools is None
+        return self.tools
+
+    def output_dir(self):
+        out_dir = os.path.join(os.path.dirname(self.project_file), "output")
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        return out_dir
+
+    def get_compile_cache(self):
+        """
+        The cache of songs compiled by incremental builds of the current project.
+        :rtype: CompileCache
+        """
+        if self.compile_cache is None:
+            self.compile_cache = CompileCache(os.path.join(self.output_dir(), '.cache'),
+                                              settings.load_build_settings()[settings.key_cache_size])
+        return self.compile_cache
+
+    def project_songs(self):
+        """
+        The songs of the project, in the order fileWidget is sorted by. Songs hidden by the filter are included.
+        :rtype: list
+        """
+        songs = list(self.songbook.songs)
+        column = self.song_proxy.sortColumn()
+        if column >= 0:
+            songs.sort(key=lambda song: self.song_model.text(song, column),
+                       reverse=self.song_proxy.sortOrder() == Qt.DescendingOrder)
+        return songs
+
+    def save_build_settings(self):
+        settings.save_build_settings(self.ui.actionIncremental_Build.isChecked(),
+                                     self.ui.actionParallel_Build.isChecked())
+
+    def show_build_cache(self):
+        cache = self.get_compile_cache()
+        msg_box = WarningMessageBox()
+        msg_box.setWindowTitle(self.tr(self.app_name + " - Build cache"))
+        msg_box.setText(self.tr("{} compiled songs, using {:.1f} of {:.1f} MB.").format(
+                len(cache), cache.total_size() / 2 ** 20, cache.max_size / 2 ** 20))
+        msg_box.setDetailedText('\n'.join('{}  {}  {} page(s)  {}'.format(key[:12], ' '.join(entry['flags']),
+                                                                          entry['pages'], entry['source'])
+                                          for key, entry in cache.entries()))
+        msg_box.setIcon(QMessageBox.Information)
+        msg_box.setStandardButtons(QMessageBox.Reset | QMessageBox.Close)
+        if msg_box.exec_() == QMessageBox.Reset:
+            cache.clear()
+
+    def run_chordii(self):
+        """
+        Compile the songbook in the background. Previews are compiled first, so the songbook may take a little longer
+        while songs are being edited.
+        """
+        tools = self.find_tools()
+        if not tools:
+            return
+        chordii_command, gs_command = tools
+        output_file = os.path.join(self.output_dir(), self.songbook.name)
+        songs = self.project_songs()
+        parallel = self.ui.actionParallel_Build.isChecked()
+        if parallel or self.ui.actionIncremental_Build.isChecked():
+            jobs = settings.load_build_settings()[settings.key_build_jobs] if parallel else 1
+            cache = self.get_compile_cache()
+
+            def work(on_start):
+                return build_incremental(chordii_command, songs, output_file, cache, jobs, self.timings, gs_command,
+                                         on_start)
+        else:
+            work = partial(build_songbook, chordii_command, songs, output_file, gs_command=gs_command,
+                           timings=self.timings)
+        self.ui.statusBar.showMessage(self.tr("Compiling songbook..."))
+        self.compile_scheduler.submit((BUILD, output_file), BUILD, work, cache=False)
+
+    def build_finished(self, pdf_file, response):
+        """
+        Show the warnings chordii printed while compiling the songbook.
+        :param pdf_file: The resulting pdf file
+        :type pdf_file: str
+        :type response: str
+        """
+        self.ui.statusBar.showMessage(self.tr("Songbook compiled."), 5000)
+        if response:
+            msg_box = WarningMessageBox()
+            msg_box.setWindowTitle(self.tr(self.app_name + " - Chordii warning"))
+            msg_box.setText(self.tr("Chordii exited with warnings."))
+            msg_box.setDetailedText(response)
+            msg_box.setIcon(QMessageBox.Warning)
+            msg_box.exec_()
         else:
-            command.append(input_file)
-        command.append("-o")
-        command.append(output_file + '.ps')
-        print('{}'.format(' '.join(map(str, command))))
-        try:
-            response = subprocess.check_output(command, stderr=subprocess.STDOUT).decode()
-            if not preview:
-                if response:
-                    msg_box = WarningMessageBox()
-                    msg_box.setWindowTitle(self.tr(self.app_name + " - Chordii warning"))
-                    msg_box.setText(self.tr("Chordii exited with warnings."))
-                    msg_box.setDetailedText(response)
-                    msg_box.setIcon(QMessageBox.Warning)
-                    msg_box.exec_()
-                else:
-                    QMessageBox.information(self, self.tr(self.app_name + " - Chordii was successful"),
-                                            self.tr("Chordii compiled the songbook without warnings!"))
-        except subprocess.CalledProcessError as e:
-            if not preview:
-                message = self.tr("Chordii crashed while compiling.")
-                if e.stderr:
-                    message += '<br' + self.tr("Chordii output:") + '<br><pre>' + e.stderr + '</pre>'
-                else:
-                    message += '<br>' + self.tr("Tip: This could be due to an incorrect chord definition.")
-                QMessageBox.critical(self, self.tr(self.app_name + " - Chordii problem"), message)
-        return ps2pdf(output_file)
-
-    def tab2chordpro(self):
-        notation = testTabFormat(self.ui.textEdit.toPlainText(), [enNotation])
+            QMessageBox.information(self, self.tr(self.app_name + " - Chordii was successful"),
+                                    self.tr("Chordii compiled the songbook without warnings!"))
+
+    def build_failed(self, error):
+        self.ui.statusBar.clearMessage()
+        if isinstance(error, Ps2PdfError):
+            msg_box = WarningMessageBox()
+            msg_box.setWindowTitle(self.tr(self.app_name + " - Ghostscript problem"))
+            msg_box.setText(self.tr("Converting the songbook to PDF failed."))
+            if error.output:
+                msg_box.setInformativeText(self.tr("See the details for the Ghostscript output."))
+                msg_box.setDetailedText(error.output)
+            msg_box.setIcon(QMessageBox.Critical)
+            msg_box.exec_()
+            return
+        if isinstance(error, ChordiiError):
+            message = self.tr("Chordii crashed while compiling.")
+            if error.output:
+                message += '<br>' + self.tr("Chordii output:") + '<br><pre>' + error.output + '</pre>'
+            else:
+                message += '<br>' + self.tr("Tip: This could be due to an incorrect chord definition.")
+        else:
+            message = self.tr("Couldn't compile the songbook: ") + str(error)
+        QMessageBox.critical(self, self.tr(self.app_name + " - Chordii problem"), message)
+
+    def tab2chordpro(self, start=0, end=None):
+        """
+        Offer to convert the lines between two positions in textEdit from the tab format to ChordPro. Only those lines
+        are tested and replaced, so that pasting into a large file does not scan the whole file.
+        :param start: The position of the start of the text, e.g. where it was pasted
+        :type start: int
+        :param end: The position of the end of the text, or None for the end of the document
+        :type end: int
+        """
+        cursor = QTextCursor(self.ui.textEdit.document())
+        cursor.setPosition(start)
+        cursor.movePosition(QTextCursor.StartOfBlock)
+        if end is None:
+            cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        else:
+            cursor.setPosition(end, QTextCursor.KeepAnchor)
+        cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+        text = cursor.selectedText().replace('\u2029', '\n')
+        from tab2chordpro.Transpose import testTabFormat, tab2ChordPro, enNotation
+        notation = testTabFormat(text, [enNotation])
         if notation is not None:
+            question = (self.tr("It seems this file is in the tab format.\n") if end is None else
+                        self.tr("It seems the pasted text is in the tab format.\n"))
             res = QMessageBox.question(self, self.tr(self.app_name),
-                                       self.tr("It seems this file is in the tab format.\n" +
-                                               "Do you want to convert it to the ChordPro format?"),
+                                       question + self.tr("Do you want to convert it to the ChordPro format?"),
                                        QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
             if res == QMessageBox.No:
                 return
-            self.ui.textEdit.setText(tab2ChordPro(self.ui.textEdit.toPlainText()))
+            cursor.insertText(tab2ChordPro(text))
 
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='A Qt GUI for Chordii.')
     parser.add_argument('project', nargs='?', help='a project file to open')
+    parser.add_argument('--startup-trace', action='store_true',
+                        help='print the time spent in each phase of start-up, until the window has been shown')
     args = parser.parse_args()
     return args
 
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+def print_startup_trace(startup):
+    startup.stages['total'] = time.perf_counter() - STARTED
+    print(startup.report())
 
-    qt_chordii = MainWindow()
-    qt_chordii.show()
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    startup = Timings() if args.startup_trace else None
+    if startup is not None:
+        startup.stages['imports'] = time.perf_counter() - STARTED
+
+    with stage(startup, 'application'):
+        app = QApplication(sys.argv)
+
+    qt_chordii = MainWindow(args, startup)
+    with stage(startup, 'show'):
+        qt_chordii.show()
+    if startup is not None:
+        # Runs once the event loop has started and the window has been painted
+        QTimer.singleShot(0, lambda: print_startup_trace(startup))
 
     app.exec_()
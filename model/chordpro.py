@@ -0,0 +1,284 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Region states, telling whether a point of a song is inside a chorus or a tab
+IN_CHORUS = 1
+IN_TAB = 2
+
+ALIASES = {
+    'ns': 'new_song', 'soc': 'start_of_chorus', 'eoc': 'end_of_chorus', 'sot': 'start_of_tab', 'eot': 'end_of_tab',
+    'ng': 'no_grid', 'g': 'grid', 'np': 'new_page', 'npp': 'new_physical_page', 'colb': 'column_break',
+    't': 'title', 'st': 'subtitle', 'c': 'comment', 'ci': 'comment_italic', 'cb': 'comment_box', 'col': 'columns'
+}
+DIRECTIVES = {
+    'new_song', 'start_of_chorus', 'end_of_chorus', 'start_of_tab', 'end_of_tab', 'define', 'no_grid', 'grid',
+    'new_page', 'new_physical_page', 'column_break'
+}
+ARGUMENT_DIRECTIVES = {
+    'title', 'subtitle', 'comment', 'comment_italic', 'comment_box', 'textfont', 'textsize', 'chordfont', 'chordsize',
+    'titles', 'columns', 'pagetype'
+}
+DIRECTIVES |= ARGUMENT_DIRECTIVES
+REGIONS = {
+    'start_of_chorus': (IN_CHORUS, True), 'end_of_chorus': (IN_CHORUS, False),
+    'start_of_tab': (IN_TAB, True), 'end_of_tab': (IN_TAB, False)
+}
+
+TOKEN_REGEX = re.compile(r'\[([^]]*)\]|\{(\w+)(:?)(\}?)|([{}])')
+NON_BMP_REGEX = re.compile('[\U00010000-\U0010ffff]')
+
+LYRICS, DIRECTIVE, COMMENT, TAB = range(4)
+
+Chord = namedtuple('Chord', ['name', 'start', 'end'])
+# A directive is whole when its keyword is followed by a colon or a closing brace
+Directive = namedtuple('Directive', ['name', 'keyword', 'argument', 'start', 'end', 'argument_start', 'argument_end',
+                                     'whole'])
+Brace = namedtuple('Brace', ['start'])
+
+
+class Line:
+    """
+    A parsed line of a ChordPro song. Offsets are indices into text.
+
+    state is the region state at the start of the line and end_state the one at its end. tokens holds the chords,
+    directives and stray braces in the order they appear. Chords inside tabs are not chords, and are left out.
+    Lines are shared between documents, and must not be changed.
+    """
+    __slots__ = ('text', 'kind', 'state', 'end_state', 'tokens', 'chords', 'directives', 'utf16_offsets')
+
+    def __init__(self, text, kind, state, end_state, tokens, chords, directives):
+        self.text = text
+        self.kind = kind
+        self.state = state
+        self.end_state = end_state
+        self.tokens = tokens
+        self.chords = chords
+        self.directives = directives
+        self.utf16_offsets = None
+
+    @property
+    def lyrics(self):
+        """
+        The text of the line without its chords.
+        :rtype: str
+        """
+        if not self.chords:
+            return self.text
+        parts = []
+        position = 0
+        for chord in self.chords:
+            parts.append(self.text[position:chord.start])
+            position = chord.end
+        parts.append(self.text[position:])
+        return ''.join(parts)
+
+    def utf16(self, offset):
+        """
+        Convert an offset into text to an offset in UTF-16 code units, as used by Qt.
+        :type offset: int
+        :rtype: int
+        """
+        if self.utf16_offsets is None:
+            if NON_BMP_REGEX.search(self.text) is None:
+                self.utf16_offsets = ()
+            else:
+                offsets = [0]
+                for character in self.text:
+                    offsets.append(offsets[-1] + (2 if character > '\uffff' else 1))
+                self.utf16_offsets = offsets
+        return self.utf16_offsets[offset] if self.utf16_offsets else offset
+
+
+def region_change(directive):
+    """
+    The region a directive starts or ends.
+    :type directive: Directive
+    :return: The region, or 0 if the directive does not start or end one, and whether it starts it
+    :rtype: tuple
+    """
+    if not directive.whole:
+        # Like {soc with neither a colon nor a closing brace
+        return 0, False
+    return REGIONS.get(directive.name, (0, False))
+
+
+@lru_cache(maxsize=8192)
+def parse_line(text, state=0):
+    """
+    Parse a line of a ChordPro song. Lines are cached, so repeated lines, like choruses, and lines parsed again after
+    an edit elsewhere are only parsed once.
+    :param text: The line, without the line break
+    :type text: str
+    :param state: The region state at the start of the line
+    :type state: int
+    :rtype: Line
+    """
+    start_state = state
+    if '[' in text or '{' in text or '}' in text:
+        tokens, chords, directives, state = parse_tokens(text, state)
+    else:
+        tokens = chords = directives = ()
+    if text.startswith('#'):
+        kind = COMMENT
+    elif directives and tokens[0] is directives[0] and not text[:directives[0].start].strip():
+        kind = DIRECTIVE
+    elif start_state & IN_TAB:
+        kind = TAB
+    else:
+        kind = LYRICS
+    return Line(text, kind, start_state, state, tokens, chords, directives)
+
+
+def parse_tokens(text, state):
+    """
+    Find the chords, directives and stray braces of a line.
+    :return: All the tokens, the chords, the directives, and the region state at the end of the line
+    :rtype: tuple
+    """
+    tokens = []
+    chords = []
+    directives = []
+    for match in TOKEN_REGEX.finditer(text):
+        group = match.lastindex
+        if group == 1:
+            if not state & IN_TAB:
+                chord = Chord(match.group(1), match.start(), match.end())
+                tokens.append(chord)
+                chords.append(chord)
+        elif group < 5:
+            keyword, colon, closing = match.group(2, 3, 4)
+            name = ALIASES.get(keyword.lower(), keyword.lower())
+            argument = None
+            argument_start = argument_end = -1
+            if colon:
+                # The argument runs to the last closing brace of the line
+                argument_end = text.rfind('}')
+                if argument_end >= match.end():
+                    argument_start = match.end()
+                    argument = text[argument_start:argument_end]
+                else:
+                    argument_end = -1
+            directive = Directive(name, keyword, argument, match.start(), match.end(), argument_start, argument_end,
+                                  bool(closing or colon))
+            region, starts = region_change(directive)
+            if starts:
+                state |= region
+            elif region:
+                state &= ~region
+            tokens.append(directive)
+            directives.append(directive)
+        else:
+            tokens.append(Brace(match.start()))
+    return tokens, chords, directives, state
+
+
+class ChordProDocument:
+    """
+    A ChordPro song parsed into lines, with their chords and directives. The document is updated line by line, and
+    only the lines that change, and the following lines whose region state changes with them, are parsed again.
+    revision is increased on every change.
+    """
+    def __init__(self, text='', cached=True):
+        """
+        :param text: The song
+        :type text: str
+        :param cached: Whether to share parsed lines through the cache of parse_line. Songs that are parsed once, e.g.
+        while indexing, should not fill the cache.
+        :type cached: bool
+        """
+        self.lines = []
+        self.revision = 0
+        self.parse_line = parse_line if cached else parse_line.__wrapped__
+        if text:
+            self.replace_lines(0, 0, text.splitlines())
+
+    def set_lines(self, texts):
+        """
+        :param texts: The lines of the song
+        :type texts: list
+        """
+        self.replace_lines(0, len(self.lines), texts)
+
+    def replace_lines(self, first, count, texts):
+        """
+        Replace lines of the document.
+        :param first: The index of the first line to replace
+        :type first: int
+        :param count: The number of lines to replace
+        :type count: int
+        :param texts: The new lines
+        :type texts: list
+        """
+        state = self.lines[first - 1].end_state if first > 0 else 0
+        lines = []
+        for text in texts:
+            line = self.parse_line(text, state)
+            lines.append(line)
+            state = line.end_state
+        self.lines[first:first + count] = lines
+        index = first + len(lines)
+        while index < len(self.lines) and self.lines[index].state != state:
+            line = self.parse_line(self.lines[index].text, state)
+            self.lines[index] = line
+            state = line.end_state
+            index += 1
+        self.revision += 1
+
+    def text(self):
+        return '\n'.join(line.text for line in self.lines)
+
+    def directives(self, name=None):
+        """
+        The directives of the document, in order.
+        :param name: Only give directives with this name, with aliases resolved, e.g. 'title' for {t:}
+        :type name: str
+        """
+        for line in self.lines:
+            for directive in line.directives:
+                if name is None or directive.name == name:
+                    yield directive
+
+    def argument(self, name):
+        """
+        The argument of the first directive with a name, e.g. the title for 'title'.
+        :return: The argument without surrounding whitespace, or None if there is no such directive
+        :rtype: str
+        """
+        for directive in self.directives(name):
+            if directive.argument is not None:
+                return directive.argument.strip()
+        return None
+
+    @property
+    def title(self):
+        return self.argument('title')
+
+    @property
+    def artist(self):
+        return self.argument('subtitle')
+
+    def chords(self):
+        """
+        The names of the chords of the document, in order, without the chords in tabs.
+        """
+        for line in self.lines:
+            for chord in line.chords:
+                yield chord.name
@@ -0,0 +1,227 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import codecs
+import re
+from array import array
+
+from model.chordpro import DIRECTIVE, LYRICS, ChordProDocument
+
+WORD_REGEX = re.compile(r'\w+')
+QUERY_REGEX = re.compile(r'"([^"]*)"|\[([^]]*)\]|([^\s"\[]+)')
+ID_SIZE = array('I').itemsize
+
+
+def tokenize(text):
+    """
+    Split a ChordPro song into the words of its lyrics and directives, and its chords. Directive names, comments and
+    the contents of tab blocks are not indexed. Chords are given as '[chord]', so they never collide with words.
+    :type text: str
+    :return: The words and the chords, both in the order they appear in the song
+    :rtype: tuple
+    """
+    words = []
+    chords = []
+    lyrics = []
+    for line in ChordProDocument(text, cached=False).lines:
+        if line.kind == DIRECTIVE:
+            for directive in line.directives:
+                if directive.argument is not None:
+                    words.extend(WORD_REGEX.findall(directive.argument.lower()))
+        elif line.kind == LYRICS:
+            chords.extend('[{}]'.format(chord.name.strip()) for chord in line.chords)
+            lyrics.append(line.lyrics)
+    words.extend(WORD_REGEX.findall('\n'.join(lyrics).lower()))
+    return words, chords
+
+
+def parse_query(query):
+    """
+    Split a search query into the sequences of tokens that must appear in a song. A quoted phrase is a sequence of
+    words, chords written next to each other are a chord progression, and every other word stands on its own.
+    :type query: str
+    :rtype: list
+    """
+    terms = []
+    progression = []
+    for match in QUERY_REGEX.finditer(query):
+        phrase, chord, word = match.groups()
+        if chord is not None:
+            progression.append('[{}]'.format(chord.strip()))
+            continue
+        if progression:
+            terms.append(progression)
+            progression = []
+        if phrase is not None:
+            words = WORD_REGEX.findall(phrase.lower())
+            if words:
+                terms.append(words)
+        else:
+            terms.extend([word] for word in WORD_REGEX.findall(word.lower()))
+    if progression:
+        terms.append(progression)
+    return terms
+
+
+def contains(sequence, pattern):
+    """
+    Whether the packed token ids in pattern appear consecutively in sequence.
+    :type sequence: bytes
+    :type pattern: bytes
+    :rtype: bool
+    """
+    start = sequence.find(pattern)
+    while start >= 0:
+        if start % ID_SIZE == 0:
+            return True
+        start = sequence.find(pattern, start + 1)
+    return False
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over the lyrics, directives and chords of songs, keyed by file path.
+
+    Every token has a posting list of the ids of the songs containing it, in ascending order. The token ids of each
+    song are also kept packed, so phrases and chord progressions are checked with a bytes search. Updating a song
+    gives it a new id and leaves the old one in the posting lists until the index is compacted.
+    """
+    def __init__(self):
+        self.vocabulary = {}
+        self.postings = []
+        self.paths = []
+        self.doc_ids = {}
+        self.words = []
+        self.chords = []
+        self.removed = 0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, file_path):
+        return file_path in self.doc_ids
+
+    def token_ids(self, tokens):
+        for token in set(tokens).difference(self.vocabulary):
+            self.vocabulary[token] = len(self.postings)
+            self.postings.append(array('I'))
+        return array('I', map(self.vocabulary.__getitem__, tokens))
+
+    def add(self, file_path, text):
+        """
+        Index a song, replacing it if it is already indexed.
+        :type file_path: str
+        :param text: The contents of the song
+        :type text: str
+        """
+        words, chords = tokenize(text)
+        self.add_tokens(file_path, words, chords)
+
+    def add_tokens(self, file_path, words, chords):
+        self.remove(file_path)
+        doc_id = len(self.paths)
+        word_ids = self.token_ids(words)
+        chord_ids = self.token_ids(chords)
+        for token_id in set(word_ids).union(chord_ids):
+            self.postings[token_id].append(doc_id)
+        self.paths.append(file_path)
+        self.doc_ids[file_path] = doc_id
+        self.words.append(word_ids.tobytes())
+        self.chords.append(chord_ids.tobytes())
+
+    def add_file(self, file_path):
+        """
+        Index a song file. Files that cannot be read are skipped.
+        :type file_path: str
+        :return: Whether the file was indexed
+        :rtype: bool
+        """
+        try:
+            with codecs.open(file_path, 'r', 'ISO-8859-1') as f:
+                text = f.read()
+        except OSError:
+            return False
+        self.add(file_path, text)
+        return True
+
+    def remove(self, file_path):
+        doc_id = self.doc_ids.pop(file_path, None)
+        if doc_id is None:
+            return
+        self.paths[doc_id] = None
+        self.words[doc_id] = self.chords[doc_id] = b''
+        self.removed += 1
+        if self.removed > 1000 and self.removed * 2 > len(self.paths):
+            self.compact()
+
+    def merge(self, other):
+        """
+        Add the songs of another index, replacing songs that are in both.
+        :type other: SearchIndex
+        """
+        names = [None] * len(other.postings)
+        for token, token_id in other.vocabulary.items():
+            names[token_id] = token
+        for file_path, doc_id in other.doc_ids.items():
+            self.add_tokens(file_path, [names[i] for i in array('I', other.words[doc_id])],
+                            [names[i] for i in array('I', other.chords[doc_id])])
+
+    def compact(self):
+        """
+        Renumber the songs, dropping the ids of removed and replaced songs from the posting lists.
+        """
+        new_ids = {}
+        for doc_id, file_path in enumerate(self.paths):
+            if file_path is not None:
+                new_ids[doc_id] = len(new_ids)
+        self.postings = [array('I', (new_ids[doc_id] for doc_id in posting if doc_id in new_ids))
+                         for posting in self.postings]
+        self.paths = [file_path for file_path in self.paths if file_path is not None]
+        self.doc_ids = {file_path: doc_id for doc_id, file_path in enumerate(self.paths)}
+        self.words = [self.words[doc_id] for doc_id in new_ids]
+        self.chords = [self.chords[doc_id] for doc_id in new_ids]
+        self.removed = 0
+
+    def search(self, query):
+        """
+        Find the songs matching all the terms of a query. Words match whole words, case insensitively, quoted phrases
+        must appear in that order, and chords written next to each other, such as '[G][C][D]', must be played in that
+        order.
+        :type query: str
+        :return: The file paths of the matching songs, or None if the query is empty
+        :rtype: set
+        """
+        terms = parse_query(query)
+        if not terms:
+            return None
+        sequences = []
+        for term in terms:
+            ids = [self.vocabulary.get(token) for token in term]
+            if None in ids:
+                return set()
+            sequences.append((term[0].startswith('['), array('I', ids)))
+        posting_lists = sorted((self.postings[token_id] for _, ids in sequences for token_id in set(ids)), key=len)
+        candidates = set(posting_lists[0])
+        for posting in posting_lists[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+        patterns = [(self.chords if is_chord else self.words, ids.tobytes()) for is_chord, ids in sequences
+                    if len(ids) > 1]
+        return {self.paths[doc_id] for doc_id in candidates
+                if self.paths[doc_id] is not None and
+                all(contains(packed[doc_id], pattern) for packed, pattern in patterns)}
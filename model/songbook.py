@@ -19,14 +19,78 @@
 
 import json
 import os
+import shutil
 
 from model.song import Song
 
+PROJECT_FORMAT = 'qtchordii-project'
+PROJECT_VERSION = 2
+
+
+def read_header(line):
+    """
+    Parse the first line of a line-delimited project file.
+    :type line: str
+    :return: The header, or None if the file is an old style JSON project
+    :rtype: dict
+    """
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or header.get('format') != PROJECT_FORMAT:
+        return None
+    if header.get('version', PROJECT_VERSION) > PROJECT_VERSION:
+        raise ValueError('Project format version {} is not supported'.format(header['version']))
+    return header
+
+
+def song_record(song, project_dir):
+    return json.dumps({'title': song.title, 'artist': song.artist,
+                       'file_path': os.path.relpath(song.file_path, project_dir)}) + '\n'
+
+
+def write_atomic(filename, lines):
+    """
+    Write a file so that it is either completely written or left as it was, by writing a temporary file next to it
+    and renaming it over the old one.
+    :type filename: str
+    :param lines: The lines to write, each ending with a newline
+    """
+    temp_name = filename + '.tmp'
+    try:
+        with open(temp_name, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp_name)
+        os.replace(temp_name, filename)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
 
 class Songbook:
+    """
+    A songbook project. Projects are saved as a header line followed by one JSON record per line. A record either adds
+    or updates the song with its file path, or removes a song:
+
+        {"format": "qtchordii-project", "version": 2, "name": "Songbook"}
+        {"title": "Title", "artist": "Artist", "file_path": "song.cho"}
+        {"remove": "song.cho"}
+
+    Saving appends records for the changes since the project was loaded or saved, as long as the file has not been
+    changed by anyone else, and rewrites the file once it holds more records than songs. Rewrites go through a
+    temporary file, so a crash leaves either the old or the new project. A record cut short by a crash while
+    appending is dropped. Old style projects, a single JSON object, are read as well, and rewritten in the new format
+    when saved.
+    """
     def __init__(self, name='Songbook'):
         self.name = name
         self.songs = []
+        self.saved = None
 
     def add_song(self, title, artist, file_path):
         self.songs.append(Song(title, artist, file_path))
@@ -36,20 +100,109 @@ class Songbook:
 
     def load(self, filename):
         project_dir = os.path.dirname(filename)
-        json_object = json.load(open(filename, 'r'))
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            line = f.readline()
+            header = read_header(line)
+            if header is None:
+                f.seek(0)
+                self.load_json(json.load(f), project_dir)
+                self.saved = None
+                return
+            self.name = header['name']
+            songs = {}
+            records = 0
+            end = len(line.encode('utf-8'))
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                record = json.loads(line)
+                records += 1
+                end += len(line.encode('utf-8'))
+                if 'remove' in record:
+                    songs.pop(record['remove'], None)
+                else:
+                    songs[record['file_path']] = Song(record['title'], record['artist'],
+                                                      os.path.join(project_dir, record['file_path']))
+        self.songs = list(songs.values())
+        self.saved = self.snapshot(filename, records, end)
+
+    def load_json(self, json_object, project_dir):
         self.name = json_object['name']
         self.songs = [
             Song(song_object['title'], song_object['artist'], os.path.join(project_dir, song_object['file_path']))
             for song_object in json_object['songs']]
 
-    def save(self, filename):
-        project_dir = os.path.dirname(filename)
-        dict_to_serialize = {
+    def snapshot(self, filename, records, end):
+        """
+        What was last saved to the project file, to find the records to append on the next save.
+        :param records: The number of song records in the file
+        :param end: The offset of the end of the last complete record
+        """
+        stat = os.stat(filename)
+        return {
+            'filename': os.path.abspath(filename),
             'name': self.name,
-            'songs': [{
-                          'artist': song.artist,
-                          'title': song.title,
-                          'file_path': os.path.relpath(song.file_path, project_dir)
-                      } for song in self.songs]
+            'songs': {song.file_path: (song.title, song.artist) for song in self.songs},
+            'records': records,
+            'end': end,
+            'stat': (stat.st_mtime_ns, stat.st_size)
         }
-        json.dump(dict_to_serialize, open(filename, 'w'), indent=4)
+
+    def save(self, filename):
+        """
+        Save the project, appending the changes since it was last loaded or saved when possible.
+        :type filename: str
+        """
+        records = self.changes(filename)
+        if records is None:
+            self.rewrite(filename)
+            return
+        if records:
+            data = ''.join(records).encode('utf-8')
+            with open(filename, 'r+b') as f:
+                # Drop a record left unfinished by a crash, so the new records start on a line of their own
+                f.seek(self.saved['end'])
+                f.truncate()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.saved = self.snapshot(filename, self.saved['records'] + len(records), self.saved['end'] + len(data))
+
+    def changes(self, filename):
+        """
+        The records to append to the project file to save the changes since it was last loaded or saved.
+        :return: The records, or None if the file must be rewritten
+        :rtype: list
+        """
+        saved = self.saved
+        if saved is None or saved['filename'] != os.path.abspath(filename) or saved['name'] != self.name:
+            return None
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        if (stat.st_mtime_ns, stat.st_size) != saved['stat']:
+            return None
+        project_dir = os.path.dirname(filename)
+        current = [song.file_path for song in self.songs]
+        current_set = set(current)
+        if len(current_set) != len(current):
+            return None
+        removed = [file_path for file_path in saved['songs'] if file_path not in current_set]
+        kept = [file_path for file_path in saved['songs'] if file_path in current_set]
+        added = [file_path for file_path in current if file_path not in saved['songs']]
+        if kept + added != current:
+            return None
+        if saved['records'] + len(removed) + len(added) > 2 * len(current) + 100:
+            return None
+        records = [json.dumps({'remove': os.path.relpath(file_path, project_dir)}) + '\n' for file_path in removed]
+        records.extend(song_record(song, project_dir) for song in self.songs
+                       if saved['songs'].get(song.file_path) != (song.title, song.artist))
+        return records
+
+    def rewrite(self, filename):
+        project_dir = os.path.dirname(filename)
+        lines = [json.dumps({'format': PROJECT_FORMAT, 'version': PROJECT_VERSION, 'name': self.name}) + '\n']
+        lines.extend(song_record(song, project_dir) for song in self.songs)
+        write_atomic(filename, lines)
+        self.saved = self.snapshot(filename, len(self.songs), sum(len(line.encode('utf-8')) for line in lines))
@@ -0,0 +1,177 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import sqlite3
+from collections import namedtuple
+
+from model.chordpro import ChordProDocument, parse_line
+
+SCHEMA_VERSION = 1
+HEADER_SIZE = 4096
+QUERY_CHUNK = 500
+
+SongInfo = namedtuple('SongInfo', ['file_path', 'mtime', 'size', 'digest', 'title', 'artist', 'key', 'chord_count',
+                                   'notation'])
+
+
+def read_header(lines):
+    """
+    Find the title and artist of a song in its first {title:} and {subtitle:} directives.
+    :param lines: The lines of the song
+    :return: The title and the artist, each None if the song does not have it
+    :rtype: tuple
+    """
+    title = artist = None
+    for line in lines:
+        for directive in parse_line.__wrapped__(line).directives:
+            if directive.argument is None:
+                continue
+            if title is None and directive.name == 'title':
+                title = directive.argument.strip()
+            elif artist is None and directive.name == 'subtitle':
+                artist = directive.argument.strip()
+        if title is not None and artist is not None:
+            break
+    return title, artist
+
+
+def read_song_header(file_path):
+    """
+    Find the title and artist of a song, only reading the first HEADER_SIZE bytes of the file. Directives for the
+    title and artist belong at the top of a song, so this is enough for well-formed songs.
+    :type file_path: str
+    :return: The title and the artist, each None if it was not found
+    :rtype: tuple
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    lines = data.decode('ISO-8859-1').splitlines()
+    if len(data) == HEADER_SIZE and len(lines) > 1:
+        # The last line may have been cut off
+        lines.pop()
+    return read_header(lines)
+
+
+def scan_song(file_path):
+    """
+    Read a song file and derive its metadata.
+    :type file_path: str
+    :rtype: SongInfo
+    """
+    stat = os.stat(file_path)
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    # Imported here, as key detection is only needed once songs are scanned
+    from tab2chordpro.Transpose import autodetectKey, autodetectNotation, enNotation, itNotation, deNotation
+    text = data.decode('ISO-8859-1')
+    document = ChordProDocument(text, cached=False)
+    notation = autodetectNotation(text, [enNotation, itNotation, deNotation])
+    return SongInfo(file_path, stat.st_mtime_ns, stat.st_size, hashlib.sha1(data).hexdigest(), document.title,
+                    document.artist, autodetectKey(text, notation), sum(1 for _ in document.chords()), notation.id)
+
+
+def try_scan_song(file_path):
+    """
+    Scan a song file, treating a file that cannot be read like a missing one.
+    :type file_path: str
+    :return: The metadata of the song, or None if it could not be read
+    :rtype: SongInfo
+    """
+    try:
+        return scan_song(file_path)
+    except (OSError, UnicodeError):
+        return None
+
+
+def scan_songs(file_paths):
+    """
+    Scan song files without an index, e.g. when the index cannot be opened.
+    :type file_paths: list
+    :return: A dictionary from file path to SongInfo, or to None if the file could not be read
+    :rtype: dict
+    """
+    return {file_path: try_scan_song(file_path) for file_path in set(file_paths)}
+
+
+class SongIndex:
+    """
+    Metadata derived from the song files of a project, stored in an SQLite database next to the project file. An
+    entry is scanned again when the modification time or size of its song file changes.
+    """
+    def __init__(self, project_file):
+        self.filename = os.path.splitext(project_file)[0] + '.chindex'
+        self.connection = sqlite3.connect(self.filename)
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            with self.connection:
+                self.connection.execute('DROP TABLE IF EXISTS songs')
+                self.connection.execute('CREATE TABLE songs (file_path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, '
+                                        'digest TEXT, title TEXT, artist TEXT, key TEXT, chord_count INTEGER, '
+                                        'notation TEXT)')
+                self.connection.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+
+    def get(self, file_path):
+        """
+        :return: The metadata of a song file, scanning it if it is not indexed or has changed
+        :rtype: SongInfo
+        """
+        return self.get_many([file_path])[file_path]
+
+    def get_many(self, file_paths):
+        """
+        Look up the metadata of many song files with a single query. Files that are not indexed or have changed are
+        scanned and indexed.
+        :type file_paths: list
+        :return: A dictionary from file path to SongInfo, or to None if the file does not exist or could not be read
+        :rtype: dict
+        """
+        wanted = list(set(file_paths))
+        indexed = {}
+        for start in range(0, len(wanted), QUERY_CHUNK):
+            chunk = wanted[start:start + QUERY_CHUNK]
+            query = 'SELECT * FROM songs WHERE file_path IN ({})'.format(', '.join('?' * len(chunk)))
+            indexed.update((row[0], SongInfo(*row)) for row in self.connection.execute(query, chunk))
+        result = {}
+        changed = []
+        for file_path in wanted:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                result[file_path] = None
+                continue
+            info = indexed.get(file_path)
+            if info is None or info.mtime != stat.st_mtime_ns or info.size != stat.st_size:
+                info = try_scan_song(file_path)
+                if info is not None:
+                    changed.append(info)
+            result[file_path] = info
+        self.put_many(changed)
+        return result
+
+    def put_many(self, infos):
+        if not infos:
+            return
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', infos)
+
+    def remove(self, file_path):
+        with self.connection:
+            self.connection.execute('DELETE FROM songs WHERE file_path = ?', (file_path,))
+
+    def close(self):
+        self.connection.close()
@@ -17,8 +17,13 @@
 # You should have received a copy of the GNU General Public License
 # along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+
 from PyQt5.QtCore import QSettings, QCoreApplication, QSize, QPoint
 
+from utils.compilecache import DEFAULT_MAX_SIZE
+from utils.toolchain import Tool
+
 APPLICATION_NAME = 'QtChordii'
 group_main_window = 'MainWindow'
 key_size = 'size'
@@ -29,6 +34,19 @@ key_splitter_sizes = 'splitter_sizes'
 group_project_settings = 'ProjectSettings'
 key_project_file = 'project_file'
 
+group_build = 'Build'
+key_incremental_build = 'incremental_build'
+key_parallel_build = 'parallel_build'
+key_build_jobs = 'build_jobs'
+key_cache_size = 'cache_size'
+
+group_toolchain = 'Toolchain'
+key_search_path = 'search_path'
+key_tools = 'tools'
+key_path = 'path'
+key_version = 'version'
+key_mtime = 'mtime'
+
 
 def set_up_settings():
     QCoreApplication.setOrganizationName(APPLICATION_NAME)
@@ -64,3 +82,57 @@ def save_project_file(filename):
 def load_project_file():
     settings = QSettings()
     return settings.value('/'.join((group_project_settings, key_project_file)))
+
+
+def save_build_settings(incremental_build, parallel_build):
+    settings = QSettings()
+    settings.beginGroup(group_build)
+    settings.setValue(key_incremental_build, incremental_build)
+    settings.setValue(key_parallel_build, parallel_build)
+    settings.endGroup()
+
+
+def load_build_settings():
+    settings = QSettings()
+    settings.beginGroup(group_build)
+    incremental_build = settings.value(key_incremental_build, False, type=bool)
+    parallel_build = settings.value(key_parallel_build, False, type=bool)
+    build_jobs = max(1, settings.value(key_build_jobs, os.cpu_count() or 1, type=int))
+    cache_size = settings.value(key_cache_size, DEFAULT_MAX_SIZE, type=int)
+    settings.endGroup()
+    return {key_incremental_build: incremental_build, key_parallel_build: parallel_build, key_build_jobs: build_jobs,
+            key_cache_size: cache_size}
+
+
+def save_toolchain(search_path, tools):
+    """
+    :param search_path: The search path the tools were looked for in
+    :type search_path: str
+    :param tools: What was found for each tool, by name, as returned by Toolchain.results()
+    :type tools: dict
+    """
+    settings = QSettings()
+    settings.beginGroup(group_toolchain)
+    settings.remove('')
+    settings.setValue(key_search_path, search_path)
+    for name, tool in tools.items():
+        settings.beginGroup(name)
+        settings.setValue(key_path, tool.path)
+        settings.setValue(key_version, tool.version)
+        settings.setValue(key_mtime, tool.mtime)
+        settings.endGroup()
+    settings.endGroup()
+
+
+def load_toolchain():
+    settings = QSettings()
+    settings.beginGroup(group_toolchain)
+    search_path = settings.value(key_search_path, type=str)
+    tools = {}
+    for name in settings.childGroups():
+        settings.beginGroup(name)
+        tools[name] = Tool(settings.value(key_path, type=str), settings.value(key_version, type=str),
+                           settings.value(key_mtime, type=float))
+        settings.endGroup()
+    settings.endGroup()
+    return {key_search_path: search_path, key_tools: tools}
@@ -13,6 +13,7 @@
 #import i18n
 import re
 import math
+from functools import lru_cache
 
 #i18n.register('Transpose')
 _ = lambda x: x
@@ -29,6 +30,10 @@ class Notation(object):
         for k in chords:
             self.chordDict[k.upper()] = i
             i += 1
+        # Roots match in any case, and are tried in the order they are listed
+        self.tokenizer = re.compile('(%s)([b#]?)' % '|'.join(
+            ''.join('[%s%s]' % (x.upper(), x.lower()) if x.upper() != x.lower() else re.escape(x) for x in k)
+            for k in chords))
         self.repl = [(re.compile(x[0]), x[1]) for x in repl]
         self.replrev = [(re.compile(x[0]), x[1]) for x in replrev]
 
@@ -46,6 +51,19 @@ class Notation(object):
     def Chord2Ord(self, chord):
         return self.chordDict[chord.upper()]
 
+    def SplitChord(self, c):
+        """
+        Split c into its root, with any accidental, and the rest of the chord
+
+        The root is spelled as in the notation, unless c is only a root.
+        """
+        m = self.tokenizer.match(c)
+        if m is None:
+            return ("", c)
+        if m.end() == len(c) and not m.group(2):
+            return (c, "")
+        return (self.chords[self.chordDict[m.group(1).upper()]] + m.group(2), c[m.end():])
+
     def __AlterationStandard(self, a, rs):
         for r in rs:
             p = 0
@@ -126,6 +144,10 @@ ptNotation = Notation(
     ]
 )
 
+# Chords are found with this expression rather than with model.chordpro, so that chords in tab sections are
+# transposed, removed and counted like all others
+chordRegex = re.compile(r'\[([^]]*)\]')
+
 defaultLangNotation = {
 'en': enNotation,
 'it': itNotation
@@ -232,16 +254,19 @@ referenceVector = [0.65713162540630443, 0.0, 0.037841466800806009, 0.0, 0.0, 0.0
                    0.0014554410308002313, 0.0, 0.00072772051540011566, 0.0, 0.0, 0.0014554410308002313, 0.0, 0.0]
 
 
+@lru_cache(maxsize=65536)
 def splitChord(c, locNotation=enNotation):
-    for k in locNotation.chords:
-        if c.upper().startswith(k.upper()):
-            if len(c) != len(k):
-                d = c[len(k)]
-                if d == "b" or d == "#":
-                    return (k + d, c[(len(k) + 1):])
-                return (k, c[len(k):])
-            return (c, "")
-    return ("", c)
+    return locNotation.SplitChord(c)
+
+
+@lru_cache(maxsize=65536)
+def standardChord(c, locNotation=enNotation):
+    """
+    Return the root and the rest of c, after the preprocessing of the notation
+
+    The root is empty if c is not a chord.
+    """
+    return locNotation.PreprocessingToStandard(*splitChord(c, locNotation))
 
 
 def __alteration(chord):
@@ -270,6 +295,26 @@ def __pos2chord(pos, key):
     return naturalScale[diff]
 
 
+__transpositionTables = {}
+
+
+def transpositionTable(s, d):
+    """
+    Return a dictionary mapping every chord root (in enNotation) to its transposition from key s to key d
+
+    Tables are built the first time a pair of keys is used.
+    """
+    table = __transpositionTables.get((s, d))
+    if table is None:
+        table = {}
+        for k in enNotation.chords:
+            for a in ('', '#', 'b'):
+                table[k + a] = __pos2chord(chord2pos(k + a, s), d)
+        __transpositionTables[(s, d)] = table
+    return table
+
+
+@lru_cache(maxsize=65536)
 def transpose(s, d, chord, notation=enNotation):
     sl = chord.find("/")
     if sl > -1:
@@ -278,10 +323,10 @@ def transpose(s, d, chord, notation=enNotation):
     c, v = splitChord(chord)
     if c == "":
         return chord
-    p = chord2pos(c, s)
-    return translateChord(__pos2chord(p, d) + v, enNotation, notation)
+    return translateChord(transpositionTable(s, d)[c[0].upper() + c[1:]] + v, enNotation, notation)
 
 
+@lru_cache(maxsize=65536)
 def translateChord(chord, sNotation=enNotation, dNotation=enNotation):
     if sNotation == dNotation:
         return chord
@@ -289,8 +334,7 @@ def translateChord(chord, sNotation=enNotation, dNotation=enNotation):
     if sl > -1:
         return "%s/%s" % (
         translateChord(chord[:sl], sNotation, dNotation), translateChord(chord[sl + 1:], sNotation, dNotation))
-    c, a = splitChord(chord, sNotation)
-    c, a = sNotation.PreprocessingToStandard(c, a)
+    c, a = standardChord(chord, sNotation)
     if c == "":
         return chord
     alt = c[-1]
@@ -305,35 +349,16 @@ def translateChord(chord, sNotation=enNotation, dNotation=enNotation):
 
 
 def transposeChordPro(s, d, text, notation=enNotation):
-    r = re.compile('\[([^]]*)\]')
-    p = 0
-    b = ''
-    for m in r.finditer(text):
-        b += "%s[%s]" % (
-        text[p:m.start()],
-        transpose(s, d, m.group(1), notation)
-        )
-        p = m.end()
-    return b + text[p:]
+    return chordRegex.sub(lambda m: "[%s]" % transpose(s, d, m.group(1), notation), text)
 
 
 def translateChordPro(text, sNotation=enNotation, dNotation=enNotation):
-    r = re.compile('\[([^]]*)\]')
-    p = 0
-    b = ''
-    for m in r.finditer(text):
-        b += "%s[%s]" % (
-        text[p:m.start()],
-        translateChord(m.group(1), sNotation, dNotation)
-        )
-        p = m.end()
-    return b + text[p:]
+    return chordRegex.sub(lambda m: "[%s]" % translateChord(m.group(1), sNotation, dNotation), text)
 
 
 def autodetectNotation(text, notations):
-    r = re.compile('\[([^]]*)\]')
     cnt = [0 for x in notations]
-    for m in r.finditer(text):
+    for m in chordRegex.finditer(text):
         for i in range(0, len(notations)):
             c, a = splitChord(m.group(1), notations[i])
             if c != "":
@@ -359,19 +384,70 @@ def scalarProduct(v1, v2):
     return count
 
 
+@lru_cache(maxsize=65536)
+def vectorIndex(chord, notation=enNotation):
+    """
+    Return the position of chord in a chord vector, or None if chord is not counted
+    """
+    chord = translateChord(chord, notation, enNotation)
+    c, a = splitChord(chord)
+    if c != "" and a in vectorModes:
+        return chord2pos(c, "C") * len(vectorModes) + vectorModes.index(a)
+    return None
+
+
+def countChords(text, notation=enNotation):
+    """
+    Return the chord vector of text, before normalization
+    """
+    v = [0] * (12 * len(vectorModes))
+    for m in chordRegex.finditer(text):
+        i = vectorIndex(m.group(1), notation)
+        if i is not None:
+            v[i] += 1
+    return v
+
+
 def vectorizeChords(text, notation=enNotation):
-    r = re.compile('\[([^]]*)\]')
-    v = [0 for x in range(12 * len(vectorModes))]
-    for m in r.finditer(text):
-        chord = translateChord(m.group(1), notation, enNotation)
-        c, a = splitChord(chord)
-        if c != "" and a in vectorModes:
-            v[chord2pos(c, "C") * len(vectorModes) + vectorModes.index(a)] += 1
-    return normalize(v)
+    return normalize(countChords(text, notation))
+
+
+def __numpy():
+    """
+    Return the numpy module, or None if it is not installed
+
+    numpy is optional, and only imported the first time a key is detected.
+    """
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+__referenceMatrix = None
+
+
+def referenceMatrix():
+    """
+    Return a 12x48 numpy matrix whose row k is referenceVector rotated to key orderedKeys[k]
+    """
+    global __referenceMatrix
+    if __referenceMatrix is None:
+        numpy = __numpy()
+        n = len(vectorModes)
+        r = numpy.array(referenceVector)
+        __referenceMatrix = numpy.array([numpy.roll(r, n * k) for k in range(0, 12)])
+    return __referenceMatrix
 
 
 def autodetectKey(text, notation=enNotation):
-    v = vectorizeChords(text, notation)
+    if __numpy() is not None:
+        return autodetectKeys([text], notation)[0]
+    return orderedKeys[__bestKey(vectorizeChords(text, notation))]
+
+
+def __bestKey(v):
     r = referenceVector
     max = 0
     key = 0
@@ -382,13 +458,41 @@ def autodetectKey(text, notation=enNotation):
             max = s
             key = k
         r = r[-n:] + r[:-n]
-    return orderedKeys[key]
+    return key
+
+
+def autodetectKeys(texts, notation=enNotation):
+    """
+    Detect the keys of many songs at once
+
+    The chord vectors of all songs are scored against all 12 keys with a single
+    matrix product. Normalizing the vectors does not change which key scores
+    best, so it is skipped. Without numpy, autodetectKey is called per song.
+        texts: song texts
+        return: list of keys, one for each text
+    """
+    numpy = __numpy()
+    if numpy is None:
+        return [autodetectKey(text, notation) for text in texts]
+    if not texts:
+        return []
+    counts = [countChords(text, notation) for text in texts]
+    scores = numpy.array(counts, dtype=float).dot(referenceMatrix().T)
+    best = scores.max(axis=1)
+    keys = scores.argmax(axis=1)
+    keys[best <= 0] = 0
+    # Keys scoring (almost) the same are decided by rounding, so they are scored
+    # the same way autodetectKey does without numpy
+    ties = (scores >= (best - 1e-9 * abs(best))[:, None]).sum(axis=1) > 1
+    return [orderedKeys[__bestKey(normalize(counts[i])) if ties[i] else k] for i, k in enumerate(keys)]
+
+
+tokenRegex = re.compile(r'(\S+)')
 
 
 def integrateChords(chords, text):
     """Integrate chord line in text line, as chordpro"""
-    r = re.compile(r'(\S+)')
-    i = r.finditer(chords)
+    i = tokenRegex.finditer(chords)
     l = [x for x in i]
     l.reverse()
     if l != []:
@@ -405,13 +509,11 @@ def integrateChords(chords, text):
 def testChordLine(line, notation=enNotation):
     """Return True iff line contains only chords"""
     # First, tokenize line: if a token is not a chord => False
-    r = re.compile(r'(\S+)')
     l = 0
     n = 0
-    for m in r.finditer(line):
+    for m in tokenRegex.finditer(line):
         c = m.group()
-        e, a = splitChord(c, notation)
-        e, a = notation.PreprocessingToStandard(e, a)
+        e, a = standardChord(c, notation)
         if e == '':
             return False
         l += len(translateChord(c, notation, enNotation))
@@ -433,6 +535,7 @@ def testTabFormat(text, notations):
     It happens iff at least 3 lines are chord lines.
     Return the best matching notation, or None
     notations is a list of notations to be tested
+    With a single notation, the test stops at the third chord line.
     """
     lines = text.splitlines()
     max = 0
@@ -442,6 +545,8 @@ def testTabFormat(text, notations):
         for l in lines:
             if testChordLine(l, n):
                 nc += 1
+                if nc >= 3 and len(notations) == 1:
+                    return n
         if nc > max and nc >= 3:
             max = nc
             maxn = n
@@ -508,6 +613,16 @@ def removeSpuriousLines(text):
     return "\n".join(out)
 
 
+@lru_cache(maxsize=65536)
+def transpositions(s, chord):
+    """
+    Return the transpositions of chord from key s to every key in scales, in the order of scales
+
+    chord is expressed using enNotation.
+    """
+    return tuple(transpose(s, k, chord) for k in scales)
+
+
 def findEasiestKey(text, fav, notation=enNotation):
     """
     Find easiest key for song.
@@ -517,20 +632,51 @@ def findEasiestKey(text, fav, notation=enNotation):
              (chords in fav are expressed using enNotation)
         return (chord_count, current_key, current_difficulty, easiest_key, easiest_difficulty)
     """
-    current_key = autodetectKey(text, notation)
-    ws = dict([(k, 0) for k in scales])
-    r = re.compile('\[([^]]*)\]')
-    count = 0
-    for m in r.finditer(text):
-        count += 1
-        chord = translateChord(m.group(1), notation)
-        for k in ws:
-            c = transpose(current_key, k, chord)
+    return __easiestKey(text, fav, notation, autodetectKey(text, notation))
+
+
+def findEasiestKeys(texts, fav, notation=enNotation):
+    """
+    Find easiest key for every song in a songbook.
+
+    The keys of all songs are detected at once, and transpositions are shared
+    between songs.
+        texts: song texts
+        fav: dictionary of (s)favourite chords, as in findEasiestKey; see also
+             easyChordsProfile
+        return: list of findEasiestKey results, one for each text
+    """
+    return [__easiestKey(text, fav, notation, current_key)
+            for text, current_key in zip(texts, autodetectKeys(texts, notation))]
+
+
+def easyChordsProfile(groups=easyChordsOrder):
+    """
+    Return a dictionary of favourite chords for findEasiestKey
+
+        groups: keys of easyChords whose chords are favourite
+        return: {chord: 1} for every chord in the groups
+    """
+    return dict((c, 1) for g in groups for c in easyChords[g][1])
+
+
+def __easiestKey(text, fav, notation, current_key):
+    # Every distinct chord is weighed once, times the number of times it occurs
+    histogram = {}
+    for m in chordRegex.finditer(text):
+        histogram[m.group(1)] = histogram.get(m.group(1), 0) + 1
+    count = sum(histogram.values())
+    keys = list(scales)
+    weights = [0] * len(keys)
+    for chord, n in histogram.items():
+        chord = translateChord(chord, notation)
+        for i, c in enumerate(transpositions(current_key, chord)):
             if c in fav:
-                ws[k] += fav[c]
+                weights[i] += fav[c] * n
+    ws = dict(zip(keys, weights))
     easiest_key = current_key
     m = ws[easiest_key]
-    for k in ws:
+    for k in keys:
         if m is None or ws[k] > m:
             easiest_key = k
             m = ws[k]
@@ -553,7 +699,7 @@ def removeChords(text):
         text: song text
         return: text without chords
     """
-    return re.sub('\[([^]]*)\]', "", text)
+    return chordRegex.sub("", text)
 
 
 def pasteChords(src, dest):
@@ -569,15 +715,14 @@ def pasteChords(src, dest):
     sd = dest.splitlines()
     out = []
     m = min(len(ss), len(sd))
-    r = re.compile('\[([^]]*)\]')
     for i in range(0, m):
-        cd = r.sub("", sd[i])
-        for x in r.finditer(ss[i]):
+        cd = chordRegex.sub("", sd[i])
+        for x in chordRegex.finditer(ss[i]):
             s = x.start()
             if len(cd) < s:
                 cd += "".join([" " for y in range(len(cd), s)])
             cd = cd[:s] + x.group(0) + cd[s:]
         out.append(cd)
     for i in range(m, len(sd)):
-        out.append(r.sub("", sd[i]))
+        out.append(chordRegex.sub("", sd[i]))
     return "\n".join(out)
@@ -0,0 +1,105 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import stat
+import sys
+
+# Stand-ins for chordii and Ghostscript. The fake chordii writes one DSC page per page of a song, naming the song and
+# the page number it prints, and appends an index page with -i. The fake gs concatenates its input files.
+FAKE_CHORDII = r'''
+import re
+import signal
+import sys
+
+# Die of a broken pipe like a C program does
+signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+args = sys.argv[1:]
+output = args[args.index('-o') + 1] if '-o' in args else None
+page = int(args[args.index('-p') + 1]) if '-p' in args else 1
+ordinal = 1
+lines = ['%!PS-Adobe-3.0', '%%EndProlog']
+index = []
+for file_name in [arg for arg in args if arg.endswith('.cho')]:
+    with open(file_name, encoding='latin-1') as f:
+        text = f.read()
+    title = re.search(r'\{t(?:itle)?:([^}]*)\}', text)
+    index.append((title.group(1) if title else file_name, page))
+    for i in range(text.count('{np}') + 1):
+        lines += ['%%Page: {} {}'.format(page, ordinal), '({} page {}) show'.format(file_name, page)]
+        page += 1
+        ordinal += 1
+if '-i' in args:
+    lines += ['%%Page: {} {}'.format(page, ordinal)]
+    lines += ['(index {} {}) show'.format(title, start) for title, start in sorted(index)]
+lines += ['%%Trailer', '%%EOF']
+data = '\n'.join(lines) + '\n'
+if output:
+    with open(output, 'w') as f:
+        f.write(data)
+else:
+    sys.stdout.write(data)
+'''
+
+FAKE_GS = r'''
+import sys
+
+output = [arg for arg in sys.argv if arg.startswith('-sOutputFile=')][0].split('=', 1)[1]
+inputs = [arg for arg in sys.argv[1:] if not arg.startswith('-')]
+data = ''
+for file_name in inputs:
+    with open(file_name) as f:
+        data += f.read()
+if not inputs:
+    data = sys.stdin.read()
+if output == '-':
+    sys.stdout.write(data)
+else:
+    with open(output, 'w') as f:
+        f.write(data)
+'''
+
+
+def write_tool(directory, name, source):
+    """
+    Write a Python script that can be run like a program.
+    :return: The path to the script
+    :rtype: str
+    """
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write('#!' + sys.executable + '\n' + source)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+def fake_tools(directory):
+    """
+    :return: The fake chordii and gs, written to directory
+    :rtype: tuple
+    """
+    return write_tool(directory, 'chordii', FAKE_CHORDII), write_tool(directory, 'gs', FAKE_GS)
+
+
+def shown_pages(pdf_file):
+    """
+    :return: What the fake tools printed on every page of a songbook, in order
+    :rtype: list
+    """
+    with open(pdf_file) as f:
+        return [line for line in f.read().splitlines() if line.endswith(') show')]
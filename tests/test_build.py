@@ -0,0 +1,160 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+
+from model.song import Song
+from tests.faketools import fake_tools, shown_pages, write_tool
+from utils.build import build_incremental, build_songbook
+from utils.chordii import ChordiiError
+from utils.compilecache import CompileCache
+from utils.ps2pdf import Ps2PdfError
+
+
+class BuildIncrementalTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.temp_dir.name
+        self.chordii, self.gs = fake_tools(self.dir)
+        self.songs = []
+        for i in range(5):
+            file_path = os.path.join(self.dir, 'song{}.cho'.format(i))
+            with open(file_path, 'w') as f:
+                # The third song takes up two pages, which moves the songs after it
+                f.write('{{title:Song {}}}\n[C]La la\n'.format(i) + ('{np}\nMore\n' if i == 2 else ''))
+            self.songs.append(Song('Song {}'.format(i), 'Artist', file_path))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def build(self, cache, jobs):
+        pdf_file, warnings = build_incremental(self.chordii, self.songs, os.path.join(self.dir, 'book'), cache,
+                                               jobs, gs_command=self.gs)
+        self.assertIsNotNone(pdf_file)
+        return shown_pages(pdf_file)
+
+    def expected_pages(self):
+        pages = ['({} page {}) show'.format(song.file_path, page)
+                 for song, page in zip(self.songs, [1, 2, 3, 5, 6])]
+        return pages[:3] + ['({} page 4) show'.format(self.songs[2].file_path)] + pages[3:]
+
+    def serial_pages(self):
+        pdf_file, warnings = build_songbook(self.chordii, self.songs, os.path.join(self.dir, 'serial'),
+                                            gs_command=self.gs)
+        return shown_pages(pdf_file)
+
+    def test_same_as_serial_build(self):
+        cache = CompileCache(os.path.join(self.dir, 'cache'))
+        pages = self.build(cache, 2)
+        self.assertEqual(self.expected_pages(), pages[:6])
+        self.assertEqual(self.serial_pages(), pages)
+        # A changed title changes the index
+        with open(self.songs[0].file_path, 'w') as f:
+            f.write('{title:Changed}\n')
+        self.assertEqual(self.serial_pages(), self.build(cache, 2))
+
+    def count_compiles(self):
+        """
+        Log the runs of chordii from now on.
+        :return: A function returning the songs passed to each run of chordii since it was last called
+        :rtype: callable
+        """
+        log_file = os.path.join(self.dir, 'calls')
+        self.chordii = write_tool(self.dir, 'counting-chordii', 'import os\nimport sys\n'
+                                  'with open({1!r}, "a") as f:\n'
+                                  '    f.write(" ".join(sys.argv[1:]) + "\\n")\n'
+                                  'os.execv({0!r}, [{0!r}] + sys.argv[1:])\n'.format(self.chordii, log_file))
+
+        def compiles():
+            if not os.path.exists(log_file):
+                return []
+            with open(log_file) as f:
+                calls = f.read().splitlines()
+            os.remove(log_file)
+            song_files = [song.file_path for song in self.songs]
+            return [[arg for arg in call.split() if arg in song_files] for call in calls
+                    if any(arg in song_files for arg in call.split())]
+        return compiles
+
+    def test_edit_compiles_only_the_edited_song(self):
+        compiles = self.count_compiles()
+        cache = CompileCache(os.path.join(self.dir, 'cache'))
+        self.build(cache, 2)
+        compiles()
+        with open(self.songs[4].file_path, 'a') as f:
+            f.write('[G]More la la\n')
+        pages = self.build(cache, 2)
+        # Only the edited song is compiled again, and the index is made without compiling the other songs
+        self.assertEqual([[self.songs[4].file_path]], compiles())
+        self.assertEqual(self.serial_pages(), pages)
+
+    def test_longer_song_moves_the_songs_after_it(self):
+        compiles = self.count_compiles()
+        cache = CompileCache(os.path.join(self.dir, 'cache'))
+        self.build(cache, 1)
+        compiles()
+        with open(self.songs[1].file_path, 'a') as f:
+            f.write('{np}\nMore\n')
+        self.build(cache, 1)
+        # The page numbers are printed by chordii, so the songs after the longer one are compiled for their new pages
+        self.assertEqual([[song.file_path] for song in self.songs[1:]], compiles())
+
+    def test_cache_smaller_than_build(self):
+        for jobs in (1, 3):
+            cache = CompileCache(os.path.join(self.dir, 'cache{}'.format(jobs)), max_size=1)
+            pages = self.build(cache, jobs)
+            self.assertEqual(self.serial_pages(), pages)
+            # Built again from what is left of the cache
+            self.assertEqual(self.serial_pages(), self.build(cache, jobs))
+
+    def test_guessed_layout_is_not_cached(self):
+        cache = CompileCache(os.path.join(self.dir, 'cache'))
+        self.build(cache, 2)
+        # One entry for every song at the page it really starts on, and one for the index of the whole songbook
+        self.assertEqual(len(self.songs) + 1, len(cache))
+        self.assertEqual(sorted(['1', '1', '2', '3', '5', '6']),
+                         sorted(entry['flags'][-1] for key, entry in cache.entries()))
+
+    def test_killed_build(self):
+        processes = []
+
+        def kill(process):
+            processes.append(process)
+            process.kill()
+
+        cache = CompileCache(os.path.join(self.dir, 'cache'))
+        with self.assertRaises(ChordiiError):
+            build_incremental(self.chordii, self.songs, os.path.join(self.dir, 'book'), cache, 2,
+                              gs_command=self.gs, on_start=kill)
+        self.assertTrue(processes)
+        self.assertEqual(0, len(cache))
+
+    def test_conversion_error(self):
+        self.gs = write_tool(self.dir, 'failing-gs', 'import sys\nprint("Unrecoverable error")\nsys.exit(1)\n')
+        cache = CompileCache(os.path.join(self.dir, 'cache'))
+        for jobs in (1, 2):
+            with self.assertRaises(Ps2PdfError) as context:
+                self.build(cache, jobs)
+            self.assertIn('Unrecoverable error', context.exception.output)
+        with self.assertRaises(Ps2PdfError):
+            build_songbook(self.chordii, self.songs, os.path.join(self.dir, 'serial'), gs_command=self.gs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import time
+import unittest
+
+from tests.faketools import fake_tools
+from utils.chordii import compile_text, run_chordii_to_pdf, unencodable_characters
+from utils.timing import Timings
+
+
+class CompileTextTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.temp_dir.name
+        self.chordii, self.gs = fake_tools(self.dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_unencodable_characters(self):
+        self.assertEqual([], unencodable_characters('{title:Café}\n[C]Olé'))
+        self.assertEqual(['€', '♪'], unencodable_characters('[C]5 € ♪ 10 €'))
+
+    def test_unencodable_characters_are_replaced(self):
+        pdf, warnings = compile_text(self.chordii, '{title:Price}\n[C]5 € ♪\n', 'song', self.dir,
+                                     gs_command=self.gs)
+        self.assertIn(b'song.cho page 1', pdf)
+        self.assertEqual("Not in ISO-8859-1, shown as '?': € (U+20AC), ♪ (U+266A)", warnings.splitlines()[0])
+
+    def test_stages_do_not_overlap(self):
+        song = os.path.join(self.dir, 'song.cho')
+        with open(song, 'w') as f:
+            f.write('{title:Song}\n[C]Words\n')
+        timings = Timings()
+        start = time.perf_counter()
+        run_chordii_to_pdf(self.chordii, [song], ['-L'], gs_command=self.gs, timings=timings)
+        seconds = time.perf_counter() - start
+        (_, chordii_start, chordii_seconds, _, _), (_, ps2pdf_start, ps2pdf_seconds, _, _) = timings.events
+        self.assertLessEqual(chordii_start + chordii_seconds, ps2pdf_start)
+        self.assertLessEqual(chordii_seconds + ps2pdf_seconds, seconds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from model.searchindex import SearchIndex
+
+SONGS = {
+    'a.cho': '{title:Amazing Grace}\n[G]Amazing [C]grace, how [G]sweet the sound\n',
+    'b.cho': '{title:Blowin in the Wind}\n[C]How many [F]roads must a [G]man walk down\n',
+    'c.cho': '{title:Country Roads}\n[G]Almost heaven, [Em]West Virginia\n',
+}
+
+
+class SearchIndexTest(unittest.TestCase):
+    def index(self, songs):
+        index = SearchIndex()
+        for file_path, text in songs.items():
+            index.add(file_path, text)
+        return index
+
+    def assertSameResults(self, expected, index):
+        for query in ['grace', 'how', '"how many"', '"many how"', '[G][C]', '[C][F][G]', '[G]', 'west', 'roads',
+                      'heaven [Em]', 'sweet wind']:
+            self.assertEqual(expected.search(query), index.search(query), query)
+
+    def test_search(self):
+        index = self.index(SONGS)
+        self.assertEqual({'a.cho', 'b.cho'}, index.search('how'))
+        self.assertEqual({'b.cho'}, index.search('"how many"'))
+        self.assertEqual(set(), index.search('"many how"'))
+        self.assertEqual({'a.cho'}, index.search('[G][C]'))
+        self.assertEqual({'c.cho'}, index.search('[Em] heaven'))
+        self.assertEqual({'a.cho', 'b.cho', 'c.cho'}, index.search('[G]'))
+        self.assertIsNone(index.search(''))
+
+    def test_update_and_remove(self):
+        index = self.index(SONGS)
+        index.add('a.cho', '{title:Other}\n[D]Nothing here\n')
+        index.remove('c.cho')
+        expected = self.index({'a.cho': '{title:Other}\n[D]Nothing here\n', 'b.cho': SONGS['b.cho']})
+        self.assertSameResults(expected, index)
+        self.assertEqual(2, len(index))
+        self.assertNotIn('c.cho', index)
+
+    def test_compact(self):
+        index = self.index(SONGS)
+        for i in range(5):
+            index.add('a.cho', SONGS['a.cho'] + 'verse {}\n'.format(i))
+        index.remove('b.cho')
+        self.assertEqual(8, len(index.paths))
+        index.compact()
+        self.assertEqual(['c.cho', 'a.cho'], index.paths)
+        self.assertEqual({'c.cho': 0, 'a.cho': 1}, index.doc_ids)
+        self.assertTrue(all(doc_id < 2 for posting in index.postings for doc_id in posting))
+        self.assertSameResults(self.index({'a.cho': SONGS['a.cho'] + 'verse 4\n', 'c.cho': SONGS['c.cho']}), index)
+        self.assertEqual({'a.cho'}, index.search('"verse 4"'))
+        self.assertEqual(set(), index.search('"verse 3"'))
+
+    def test_removing_many_songs_compacts(self):
+        index = SearchIndex()
+        for i in range(3000):
+            index.add('{}.cho'.format(i), '[C]song {}\n'.format(i))
+        for i in range(2000):
+            index.remove('{}.cho'.format(i))
+        self.assertLess(len(index.paths), 3000)
+        self.assertEqual(1000, len(index))
+        self.assertEqual({'2500.cho'}, index.search('"song 2500"'))
+        self.assertEqual(set(), index.search('"song 1500"'))
+
+    def test_merge(self):
+        index = self.index({'a.cho': '[D]Old words\n', 'b.cho': SONGS['b.cho']})
+        index.merge(self.index({'a.cho': SONGS['a.cho'], 'c.cho': SONGS['c.cho']}))
+        self.assertSameResults(self.index(SONGS), index)
+        self.assertEqual(set(), index.search('old'))
+        self.assertEqual(3, len(index))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import unittest
+
+from model.songbook import Songbook
+
+
+class SongbookTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.temp_dir.name
+        self.filename = os.path.join(self.dir, 'project.chproj')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def song_path(self, i):
+        return os.path.join(self.dir, 'song{}.cho'.format(i))
+
+    def songbook(self, count):
+        songbook = Songbook('Book')
+        for i in range(count):
+            songbook.add_song('Title {}'.format(i), 'Artist {}'.format(i), self.song_path(i))
+        return songbook
+
+    def contents(self):
+        with open(self.filename, 'rb') as f:
+            return f.read()
+
+    def load(self):
+        songbook = Songbook()
+        songbook.load(self.filename)
+        return songbook
+
+    def assertSameSongs(self, expected, songbook):
+        self.assertEqual([(song.title, song.artist, song.file_path) for song in expected.songs],
+                         [(song.title, song.artist, song.file_path) for song in songbook.songs])
+
+    def test_save_and_load(self):
+        songbook = self.songbook(3)
+        songbook.save(self.filename)
+        loaded = self.load()
+        self.assertEqual('Book', loaded.name)
+        self.assertSameSongs(songbook, loaded)
+
+    def test_changes_are_appended(self):
+        songbook = self.songbook(3)
+        songbook.save(self.filename)
+        before = self.contents()
+        songbook.add_song('New', 'Artist', self.song_path(3))
+        songbook.songs[0].title = 'Renamed'
+        del songbook.songs[1]
+        songbook.save(self.filename)
+        after = self.contents()
+        self.assertTrue(after.startswith(before))
+        records = [json.loads(line) for line in after[len(before):].decode('utf-8').splitlines()]
+        self.assertEqual([{'remove': 'song1.cho'},
+                          {'title': 'Renamed', 'artist': 'Artist 0', 'file_path': 'song0.cho'},
+                          {'title': 'New', 'artist': 'Artist', 'file_path': 'song3.cho'}], records)
+        self.assertSameSongs(songbook, self.load())
+
+    def test_unchanged_project_is_not_written(self):
+        songbook = self.songbook(3)
+        songbook.save(self.filename)
+        before = self.contents()
+        self.assertEqual([], songbook.changes(self.filename))
+        songbook.save(self.filename)
+        self.assertEqual(before, self.contents())
+
+    def test_torn_last_record_is_dropped(self):
+        songbook = self.songbook(2)
+        songbook.save(self.filename)
+        before = self.contents()
+        with open(self.filename, 'ab') as f:
+            f.write(b'{"title": "Torn", "artist": "Art')
+        loaded = self.load()
+        self.assertSameSongs(songbook, loaded)
+        loaded.add_song('New', 'Artist', self.song_path(2))
+        loaded.save(self.filename)
+        after = self.contents()
+        self.assertTrue(after.startswith(before))
+        self.assertNotIn(b'Torn', after)
+        self.assertSameSongs(loaded, self.load())
+
+    def test_project_changed_by_someone_else_is_rewritten(self):
+        songbook = self.songbook(2)
+        songbook.save(self.filename)
+        other = self.load()
+        other.add_song('Other', 'Artist', self.song_path(5))
+        other.save(self.filename)
+        songbook.add_song('New', 'Artist', self.song_path(2))
+        self.assertIsNone(songbook.changes(self.filename))
+        songbook.save(self.filename)
+        self.assertSameSongs(songbook, self.load())
+
+    def test_rewrite_threshold(self):
+        songbook = self.songbook(1)
+        songbook.save(self.filename)
+        song = songbook.songs[0]
+        rewrites = 0
+        for _ in range(200):
+            songbook.songs = [] if songbook.songs else [song]
+            if songbook.changes(self.filename) is None:
+                rewrites += 1
+            songbook.save(self.filename)
+            lines = self.contents().splitlines()
+            # The header and at most 2 * songs + 100 records
+            self.assertLessEqual(len(lines), 1 + 2 * len(songbook.songs) + 100)
+            self.assertSameSongs(songbook, self.load())
+        self.assertGreater(rewrites, 0)
+        self.assertLess(rewrites, 10)
+
+    def test_reordering(self):
+        songbook = self.songbook(4)
+        songbook.save(self.filename)
+        songbook.songs.insert(0, songbook.songs.pop(2))
+        self.assertIsNone(songbook.changes(self.filename))
+        songbook.save(self.filename)
+        self.assertSameSongs(songbook, self.load())
+        self.assertEqual(5, len(self.contents().splitlines()))
+
+    def test_legacy_json_project(self):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump({'name': 'Old book',
+                       'songs': [{'title': 'Title 0', 'artist': 'Artist 0', 'file_path': 'song0.cho'},
+                                 {'title': 'Title 1', 'artist': 'Artist 1', 'file_path': 'song1.cho'}]}, f, indent=4)
+        loaded = self.load()
+        self.assertEqual('Old book', loaded.name)
+        expected = self.songbook(2)
+        self.assertSameSongs(expected, loaded)
+        self.assertIsNone(loaded.changes(self.filename))
+        loaded.save(self.filename)
+        self.assertEqual({'format': 'qtchordii-project', 'version': 2, 'name': 'Old book'},
+                         json.loads(self.contents().splitlines()[0]))
+        self.assertSameSongs(expected, self.load())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+
+from model.songindex import SongIndex, read_song_header
+
+
+class SongIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.temp_dir.name
+        self.index = SongIndex(os.path.join(self.dir, 'project.chproj'))
+
+    def tearDown(self):
+        self.index.close()
+        self.temp_dir.cleanup()
+
+    def write_song(self, name, text, mtime_ns=None):
+        file_path = os.path.join(self.dir, name)
+        with open(file_path, 'w', encoding='ISO-8859-1') as f:
+            f.write(text)
+        if mtime_ns is not None:
+            os.utime(file_path, ns=(mtime_ns, mtime_ns))
+        return file_path
+
+    def test_scan(self):
+        file_path = self.write_song('a.cho', '{title:Title}\n{subtitle:Artist}\n[G]One [C]two [D]three\n')
+        info = self.index.get(file_path)
+        self.assertEqual(('Title', 'Artist', 3), (info.title, info.artist, info.chord_count))
+        self.assertEqual(('Title', 'Artist'), read_song_header(file_path))
+
+    def test_missing_file(self):
+        file_path = self.write_song('a.cho', '{title:Title}\n')
+        missing = os.path.join(self.dir, 'missing.cho')
+        infos = self.index.get_many([file_path, missing])
+        self.assertEqual('Title', infos[file_path].title)
+        self.assertIsNone(infos[missing])
+
+    def test_unchanged_rows_are_not_scanned(self):
+        file_path = self.write_song('a.cho', '{title:Old}\n', mtime_ns=1000000000)
+        self.assertEqual('Old', self.index.get(file_path).title)
+        # Same size and modification time, so the indexed row is used
+        self.write_song('a.cho', '{title:New}\n', mtime_ns=1000000000)
+        self.assertEqual('Old', self.index.get(file_path).title)
+
+    def test_stale_rows_are_scanned(self):
+        file_path = self.write_song('a.cho', '{title:Old}\n', mtime_ns=1000000000)
+        self.assertEqual('Old', self.index.get(file_path).title)
+        self.write_song('a.cho', '{title:New}\n', mtime_ns=2000000000)
+        info = self.index.get(file_path)
+        self.assertEqual('New', info.title)
+        self.assertEqual(2000000000, info.mtime)
+        self.index.close()
+        self.index = SongIndex(os.path.join(self.dir, 'project.chproj'))
+        # The refreshed row was stored
+        self.write_song('a.cho', '{title:Neu}\n', mtime_ns=2000000000)
+        self.assertEqual('New', self.index.get(file_path).title)
+
+    def test_many_songs(self):
+        file_paths = [self.write_song('{}.cho'.format(i), '{{title:Song {}}}\n'.format(i)) for i in range(1200)]
+        infos = self.index.get_many(file_paths)
+        self.assertEqual(['Song {}'.format(i) for i in range(1200)], [infos[path].title for path in file_paths])
+        self.assertEqual(infos, self.index.get_many(file_paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tests.faketools import fake_tools
+from utils.toolchain import GS, Toolchain
+
+
+class ToolchainTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.temp_dir.name
+        self.chordii, self.gs = fake_tools(self.dir)
+        self.bin_dir = os.path.join(self.dir, 'bin')
+        os.mkdir(self.bin_dir)
+        os.rename(self.gs, os.path.join(self.bin_dir, 'gs'))
+        self.environment = mock.patch.dict(os.environ, {'PATH': self.bin_dir})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+        self.temp_dir.cleanup()
+
+    def test_missing_tool_is_remembered(self):
+        toolchain = Toolchain()
+        self.assertIsNone(toolchain.chordii())
+        self.assertEqual(os.path.join(self.bin_dir, 'gs'), toolchain.path(GS))
+        self.assertTrue(toolchain.changed)
+
+        toolchain = Toolchain(toolchain.search_path, toolchain.results())
+        self.assertIsNone(toolchain.chordii())
+        self.assertEqual(os.path.join(self.bin_dir, 'gs'), toolchain.path(GS))
+        self.assertFalse(toolchain.changed)
+
+    def test_installed_tool_is_found(self):
+        toolchain = Toolchain()
+        self.assertIsNone(toolchain.chordii())
+        os.rename(self.chordii, os.path.join(self.bin_dir, 'chordii'))
+        # Make sure the directory looks modified even on file systems with coarse timestamps
+        os.utime(self.bin_dir, (0, os.stat(self.bin_dir).st_mtime + 10))
+
+        toolchain = Toolchain(toolchain.search_path, toolchain.results())
+        self.assertEqual(os.path.join(self.bin_dir, 'chordii'), toolchain.chordii())
+        self.assertTrue(toolchain.changed)
+
+
+if __name__ == '__main__':
+    unittest.main()
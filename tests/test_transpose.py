@@ -0,0 +1,122 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import time
+import unittest
+
+from tab2chordpro import Transpose
+from tests import baseline_transpose as baseline
+
+NOTATIONS = ['enNotation', 'itNotation', 'frNotation', 'ptNotation', 'deNotation']
+SUFFIXES = ['', 'm', '7', 'm7', 'maj7', 'sus4', 'dim', 'aug', '-', '-7', '7+', '4', 'add9', '6']
+NOT_CHORDS = ['', 'N.C.', 'x', '*', 'Intro', 'b', '#', 'Hm', 'x/']
+
+
+def random_chord(rng, notation):
+    if rng.random() < 0.1:
+        return rng.choice(NOT_CHORDS)
+    root = rng.choice(notation.chords)
+    root = rng.choice([root, root.lower(), root.upper()]) + rng.choice(['', '', '#', 'b'])
+    chord = root + rng.choice(SUFFIXES)
+    if rng.random() < 0.2:
+        chord += '/' + random_chord(rng, notation)
+    return chord
+
+
+def random_song(rng, notation, lines=40):
+    """
+    A song in notation, with chords in lyrics, comments and tab sections, and brackets that are not chords.
+    """
+    out = ['{title:Random}']
+    for i in range(lines):
+        kind = rng.random()
+        if kind < 0.1:
+            out.append(rng.choice(['{sot}', '{eot}', '{soc}', '{eoc}', '{start_of_tab}', '{end_of_tab}']))
+        elif kind < 0.15:
+            out.append('{c:[%s] intro}' % random_chord(rng, notation))
+        elif kind < 0.2:
+            out.append('la ] la [ unclosed')
+        else:
+            out.append(''.join('[%s]%s ' % (random_chord(rng, notation), rng.choice(['la', 'lo', '', 'ti-', 'é']))
+                               for _ in range(rng.randint(0, 6))))
+    return '\n'.join(out) + '\n'
+
+
+def outcome(function, *args):
+    """
+    :return: The result of a call, or the type of the exception it raised
+    """
+    try:
+        return function(*args)
+    except Exception as e:
+        return type(e)
+
+
+class TransposeEquivalenceTest(unittest.TestCase):
+    """
+    The optimized transposition must give the same output as the functions it replaced.
+    """
+    def test_transpose_chordpro(self):
+        rng = random.Random(7)
+        for name in NOTATIONS:
+            notation, base_notation = getattr(Transpose, name), getattr(baseline, name)
+            for _ in range(20):
+                text = random_song(rng, notation)
+                s, d = rng.choice(baseline.orderedKeys), rng.choice(baseline.orderedKeys)
+                self.assertEqual(outcome(baseline.transposeChordPro, s, d, text, base_notation),
+                                 outcome(Transpose.transposeChordPro, s, d, text, notation), (name, s, d, text))
+
+    def test_translate_chordpro(self):
+        rng = random.Random(11)
+        for source in NOTATIONS:
+            for destination in NOTATIONS:
+                for _ in range(5):
+                    text = random_song(rng, getattr(Transpose, source))
+                    self.assertEqual(
+                        outcome(baseline.translateChordPro, text, getattr(baseline, source),
+                                getattr(baseline, destination)),
+                        outcome(Transpose.translateChordPro, text, getattr(Transpose, source),
+                                getattr(Transpose, destination)), (source, destination, text))
+
+    def test_tab_chords_are_transposed(self):
+        self.assertEqual('{sot}\n[D]tab [A]x\n{eot}\n',
+                         Transpose.transposeChordPro('C', 'D', '{sot}\n[C]tab [G]x\n{eot}\n'))
+
+
+class TransposeSpeedTest(unittest.TestCase):
+    def test_faster_than_baseline(self):
+        rng = random.Random(3)
+        text = ''.join(random_song(rng, Transpose.enNotation, 200) for _ in range(10))
+        text = text * max(1, 50000 // text.count('['))
+
+        def best_time(function, *args):
+            times = []
+            for _ in range(3):
+                start = time.perf_counter()
+                function(*args)
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        baseline_time = best_time(baseline.transposeChordPro, 'C', 'E', text)
+        optimized_time = best_time(Transpose.transposeChordPro, 'C', 'E', text)
+        # The margin is wide, so that the test does not depend on the speed of the machine
+        self.assertLess(optimized_time * 2, baseline_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,289 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from model.songindex import read_song_header
+from utils.chordii import SONGBOOK_FLAGS, SONG_ENCODING, ChordiiError, run_chordii, run_chordii_to_pdf, count_pages, \
+    extract_pages
+from utils.ps2pdf import merge_to_pdf
+from utils.timing import stage
+
+
+def song_flags(start_page):
+    """
+    The chordii flags for one song of a songbook, starting at start_page. Songs always start on a new page, so
+    compiling them one at a time with these flags gives the same page numbering as compiling the whole songbook with
+    SONGBOOK_FLAGS.
+
+    chordii prints the page numbers into the PostScript, so a song compiled for one start page cannot be reused at
+    another, and the start page is part of the cache key. A song that moves, because a song before it was inserted,
+    removed or changed its number of pages, is compiled again.
+    :type start_page: int
+    :rtype: list
+    """
+    return ['-L', '-p', str(start_page)]
+
+
+def compile_piece(chordii_command, file_path, digest, flags, cache, work_dir, compiled, timings=None, on_start=None):
+    """
+    Compile a single ChordPro file, or fetch it from the cache if it has not changed since it was last compiled.
+
+    Pieces compiled here are not put in the cache, as they may have been compiled for a guessed layout. Only the
+    number of pages is recorded, so that the layout can be worked out.
+    :param digest: The hash of the contents of file_path
+    :param work_dir: The directory to compile the piece in
+    :type work_dir: str
+    :param compiled: The pieces compiled by this build so far, by key, which are not compiled again
+    :type compiled: dict
+    :param timings: If given, the time spent in chordii is added to it
+    :type timings: utils.timing.Timings
+    :param on_start: Called with chordii once it has started, e.g. to be able to kill it
+    :type on_start: callable
+    :return: The cache key, the cache entry of the piece, and the ps file if it was compiled by this build (None if
+        it came from the cache)
+    :rtype: tuple
+    """
+    key = cache.key(digest, flags)
+    if key in compiled:
+        return (key,) + compiled[key]
+    entry = cache.get(key)
+    if entry is not None:
+        return key, entry, None
+    ps_file = os.path.join(work_dir, key + '.ps')
+    try:
+        warnings = run_chordii(chordii_command, [file_path], ps_file, flags, on_start, timings)
+    except ChordiiError as e:
+        raise ChordiiError('{}:\n{}'.format(file_path, e.output))
+    pages = count_pages(ps_file)
+    cache.set_pages(digest, pages)
+    entry = {'source': file_path, 'digest': digest, 'flags': list(flags), 'pages': pages, 'warnings': warnings}
+    compiled[key] = entry, ps_file
+    return key, entry, ps_file
+
+
+def store_pieces(pieces, cache):
+    """
+    Put the pieces compiled by a build in the cache, once they are known to be laid out right.
+    :param pieces: (key, entry, ps file) as returned by compile_piece
+    :type pieces: list
+    :return: (key, entry) of every piece
+    :rtype: list
+    """
+    stored = []
+    for key, entry, ps_file in pieces:
+        if ps_file is not None:
+            entry = cache.put(key, ps_file, entry['source'], entry['digest'], entry['flags'], entry['pages'],
+                              entry['warnings'])
+        stored.append((key, entry))
+    return stored
+
+
+def index_stub(file_path, pages):
+    """
+    The text of a stand-in for a song, which chordii lists in its index like the song itself: the title and subtitle
+    of the song, on as many pages as the song takes up.
+    :param file_path: The song
+    :type file_path: str
+    :param pages: The number of pages of the song
+    :type pages: int
+    :rtype: str
+    """
+    title, artist = read_song_header(file_path)
+    lines = []
+    if title is not None:
+        lines.append('{title:' + title + '}')
+    if artist is not None:
+        lines.append('{subtitle:' + artist + '}')
+    lines.append('\n{np}\n'.join(['.'] * max(1, pages)))
+    return '\n'.join(lines) + '\n'
+
+
+def compile_index(chordii_command, songs, stubs, first_page, cache, work_dir, timings=None, on_start=None):
+    """
+    Compile the index of a songbook, or fetch it from the cache if no song has changed its title, subtitle or number
+    of pages since it was last compiled. chordii only makes an index when it compiles all songs at once, so it is made
+    from stand-ins for the songs, which are quick to compile, and the pages after the stand-ins are kept.
+    :param songs: The songs of the songbook, in songbook order
+    :type songs: list
+    :param stubs: The texts of the stand-ins of the songs, made by index_stub
+    :type stubs: list
+    :param first_page: The first page after the last song
+    :type first_page: int
+    :param on_start: Called with chordii once it has started, e.g. to be able to kill it
+    :type on_start: callable
+    :return: The cache key, the cache entry of the index, and its ps file if it was compiled by this build (None if it
+        came from the cache), like compile_piece
+    :rtype: tuple
+    """
+    key = cache.key(hashlib.sha1('\0'.join(stubs).encode('utf-8', 'surrogatepass')).hexdigest(), SONGBOOK_FLAGS)
+    entry = cache.get(key)
+    if entry is not None:
+        return key, entry, None
+    stub_files = []
+    for i, (song, stub) in enumerate(zip(songs, stubs)):
+        # Each stand-in has the file name of its song, in case chordii lists a song without a title by its name
+        stub_file = os.path.join(work_dir, 'index', str(i), os.path.basename(song.file_path))
+        os.makedirs(os.path.dirname(stub_file))
+        with open(stub_file, 'wb') as f:
+            f.write(stub.encode(SONG_ENCODING, errors='replace'))
+        stub_files.append(stub_file)
+    songbook_file = os.path.join(work_dir, 'index', 'songbook.ps')
+    # The warnings are those of the songs, which are already reported with them
+    run_chordii(chordii_command, stub_files, songbook_file, SONGBOOK_FLAGS, on_start, timings)
+    ps_file = os.path.join(work_dir, key + '.ps')
+    pages = extract_pages(songbook_file, first_page, ps_file)
+    entry = {'source': 'index', 'digest': key, 'flags': list(SONGBOOK_FLAGS), 'pages': pages, 'warnings': ''}
+    return key, entry, ps_file
+
+
+def layout(digests, cache):
+    """
+    Work out the first page of every song, guessing that songs which have not been compiled yet take up one page.
+    :param digests: The hashes of the songs, in songbook order
+    :return: The first page of every song, and the first page after the last song
+    :rtype: tuple
+    """
+    start_pages = []
+    page = 1
+    for digest in digests:
+        start_pages.append(page)
+        page += cache.pages(digest) or 1
+    return start_pages, page
+
+
+def run_all(pool, tasks):
+    """
+    Run tasks on a pool and return their results in the order of the tasks. If a task fails, the tasks that have
+    not started yet are cancelled and the exception is raised.
+    """
+    futures = [pool.submit(task) for task in tasks]
+    try:
+        return [future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def chunks(items, count):
+    """
+    Split items into at most count contiguous chunks of about the same size.
+    :rtype: list
+    """
+    size = max(1, -(-len(items) // count))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def build_incremental(chordii_command, songs, output_file, cache, jobs=1, timings=None, gs_command='gs',
+                      on_start=None):
+    """
+    Compile a songbook one song at a time, only running chordii for songs that changed since the last build. The
+    index is the one chordii makes for the whole songbook, so the result is the same as that of build_songbook.
+
+    The songs are compiled and converted to PDF on jobs worker threads. The workers only wait for chordii and
+    Ghostscript processes, so threads are enough to keep that many cores busy.
+    :param chordii_command: The chordii executable to run
+    :param songs: The songs to compile, in songbook order
+    :type songs: list
+    :param output_file: The filename of the resulting pdf, without extension
+    :type output_file: str
+    :param cache: The cache holding previously compiled songs
+    :type cache: utils.compilecache.CompileCache
+    :param jobs: The number of songs to compile at the same time
+    :type jobs: int
+    :param timings: If given, the time spent in each stage of the build is added to it. The stages of the build
+        (compile, index, convert) contain the runs of chordii and ps2pdf, which may overlap when jobs > 1.
+    :type timings: utils.timing.Timings
+    :param gs_command: The Ghostscript executable to run
+    :type gs_command: str
+    :param on_start: Called with every chordii and Ghostscript process once it has started, e.g. to be able to kill
+        them. It is called from the worker threads.
+    :type on_start: callable
+    :return: The resulting pdf file, and the warnings chordii printed
+    :rtype: tuple
+    :raises utils.ps2pdf.Ps2PdfError: If the conversion to PDF failed
+    """
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool, \
+                tempfile.TemporaryDirectory(dir=cache.cache_dir) as work_dir:
+            with stage(timings, 'hash'):
+                digests = run_all(pool, [partial(cache.digest, song.file_path) for song in songs])
+
+            # The page counts of songs compiled in the first pass are known afterwards, so a second pass is only
+            # needed when a new song turned out to be longer than one page. Only the pieces of the last pass are put
+            # in the cache.
+            with stage(timings, 'compile'):
+                compiled = {}
+                layout_guess = None
+                while layout_guess != layout(digests, cache):
+                    layout_guess = layout(digests, cache)
+                    pieces = run_all(pool, [partial(compile_piece, chordii_command, song.file_path, digest,
+                                                    song_flags(start_page), cache, work_dir, compiled, timings,
+                                                    on_start)
+                                            for song, digest, start_page in zip(songs, digests, layout_guess[0])])
+                end_page = layout_guess[1]
+
+            with stage(timings, 'index'):
+                stubs = run_all(pool, [partial(index_stub, song.file_path, cache.pages(digest))
+                                       for song, digest in zip(songs, digests)])
+                pieces.append(compile_index(chordii_command, songs, stubs, end_page, cache, work_dir, timings,
+                                            on_start))
+            pieces = store_pieces(pieces, cache)
+
+            warnings = ''.join(entry['warnings'] for key, entry in pieces)
+            ps_files = [cache.path(key) for key, entry in pieces]
+            with stage(timings, 'convert'):
+                if jobs == 1:
+                    return merge_to_pdf(ps_files, output_file + '.pdf', gs_command, timings, on_start), warnings
+                chunk_files = [os.path.join(work_dir, 'chunk{}.pdf'.format(i)) for i in range(jobs)]
+                chunk_files = run_all(pool, [partial(merge_to_pdf, chunk, chunk_file, gs_command, timings, on_start)
+                                             for chunk, chunk_file in zip(chunks(ps_files, jobs), chunk_files)])
+                return merge_to_pdf(chunk_files, output_file + '.pdf', gs_command, timings, on_start), warnings
+    finally:
+        # Evicting only now keeps the pieces of this build until they have been converted
+        cache.evict()
+        cache.save()
+
+
+def build_songbook(chordii_command, songs, output_file, on_start=None, gs_command='gs', timings=None):
+    """
+    Compile a whole songbook with a single chordii process.
+    :param chordii_command: The chordii executable to run
+    :param songs: The songs to compile, in songbook order
+    :type songs: list
+    :param output_file: The filename of the resulting pdf, without extension
+    :type output_file: str
+    :param on_start: Called with chordii and Ghostscript once each of them has started, e.g. to be able to kill them
+    :type on_start: callable
+    :param gs_command: The Ghostscript executable to run
+    :type gs_command: str
+    :param timings: If given, the time spent in chordii and Ghostscript and their peak memory use are added to it
+    :type timings: utils.timing.Timings
+    :return: The resulting pdf file, and the warnings chordii printed
+    :rtype: tuple
+    :raises utils.ps2pdf.Ps2PdfError: If the conversion to PDF failed
+    """
+    pdf, warnings = run_chordii_to_pdf(chordii_command, [song.file_path for song in songs], SONGBOOK_FLAGS, on_start,
+                                       gs_command, timings)
+    pdf_file = output_file + '.pdf'
+    with open(pdf_file, 'wb') as f:
+        f.write(pdf)
+    return pdf_file, warnings
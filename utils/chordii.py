@@ -0,0 +1,248 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+from utils.ps2pdf import Ps2PdfError, ps2pdf_stream
+from utils.timing import Timings, stage, watch_memory
+
+SONGBOOK_FLAGS = ['-i', '-L', '-p', '1']
+# The encoding of song files, which is what chordii reads
+SONG_ENCODING = 'ISO-8859-1'
+# Directories backed by memory, where files that only live while a song is compiled are cheap to write
+RAM_DIRS = (os.environ.get('XDG_RUNTIME_DIR'), '/dev/shm')
+
+
+class ChordiiError(Exception):
+    """
+    Raised when chordii exits with a non-zero status.
+    """
+    def __init__(self, output):
+        super().__init__(output)
+        self.output = output
+
+
+def run_chordii(chordii_command, input_files, output_file, flags=(), on_start=None, timings=None):
+    """
+    Compile ChordPro files to PostScript.
+    :param chordii_command: The chordii executable to run
+    :type chordii_command: str
+    :param input_files: The ChordPro files to compile, in songbook order
+    :type input_files: list
+    :param output_file: The name of the resulting ps file
+    :type output_file: str
+    :param flags: Extra command line options passed to chordii
+    :type flags: list
+    :param on_start: Called with the chordii process once it has started, e.g. to be able to kill it
+    :type on_start: callable
+    :param timings: If given, the time spent in chordii and its peak memory use are added to it
+    :type timings: utils.timing.Timings
+    :return: The warnings chordii printed while compiling
+    :rtype: str
+    """
+    command = [chordii_command] + list(flags) + list(input_files) + ['-o', output_file]
+    with stage(timings, 'chordii') as details:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        with watch_memory(process, details):
+            if on_start is not None:
+                on_start(process)
+            output = process.communicate()[0].decode()
+    if process.returncode:
+        raise ChordiiError(output)
+    return output
+
+
+def run_chordii_to_pdf(chordii_command, input_files, flags=(), on_start=None, gs_command='gs', timings=None):
+    """
+    Compile ChordPro files to PDF, piping the PostScript from chordii straight into Ghostscript.
+    :param chordii_command: The chordii executable to run
+    :type chordii_command: str
+    :param input_files: The ChordPro files to compile, in songbook order
+    :type input_files: list
+    :param flags: Extra command line options passed to chordii
+    :type flags: list
+    :param on_start: Called with chordii and Ghostscript once each of them has started, e.g. to be able to kill them
+    :type on_start: callable
+    :param gs_command: The Ghostscript executable to run
+    :type gs_command: str
+    :param timings: If given, the time spent in chordii and Ghostscript and their peak memory use are added to it.
+        The two run at the same time, so the ps2pdf stage is the time Ghostscript takes after chordii has exited.
+    :type timings: utils.timing.Timings
+    :return: The PDF, and the warnings chordii printed while compiling
+    :rtype: tuple
+    :raises ChordiiError: If chordii failed, in which case Ghostscript usually fails as well
+    :raises utils.ps2pdf.Ps2PdfError: If only the conversion failed
+    """
+    command = [chordii_command] + list(flags) + list(input_files)
+    start = time.perf_counter()
+    details = {}
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with watch_memory(process, details):
+        if on_start is not None:
+            on_start(process)
+        # Read the warnings while Ghostscript reads the PostScript, so that neither pipe fills up
+        warnings = []
+        chordii_end = []
+
+        def read_warnings():
+            warnings.append(process.stderr.read())
+            process.wait()
+            chordii_end.append(time.perf_counter())
+
+        reader = threading.Thread(target=read_warnings)
+        reader.start()
+        # Ghostscript is timed on its own, so that the stages do not overlap
+        conversion = Timings() if timings is not None else None
+        conversion_error = None
+        try:
+            pdf = ps2pdf_stream(process.stdout, on_start, gs_command, conversion)
+        except Ps2PdfError as e:
+            conversion_error = e
+        finally:
+            gs_end = time.perf_counter()
+            process.stdout.close()
+            reader.join()
+    if timings is not None:
+        timings.add('chordii', start, chordii_end[0] - start, details)
+        timings.add('ps2pdf', chordii_end[0], max(0.0, gs_end - chordii_end[0]), conversion.last['ps2pdf'][1])
+    output = warnings[0].decode() if warnings else ''
+    # chordii is killed by SIGPIPE (where there is one) when Ghostscript gives up before reading all of its output
+    broken_pipe = conversion_error is not None and process.returncode == -getattr(signal, 'SIGPIPE', 0)
+    if process.returncode and not broken_pipe:
+        raise ChordiiError(output)
+    if conversion_error is not None:
+        raise conversion_error
+    return pdf, output
+
+
+def compile_text(chordii_command, text, file_name, work_dir, on_start=None, gs_command='gs', timings=None):
+    """
+    Compile ChordPro text that is not saved, e.g. the song being edited, to PDF. The text is encoded like a saved
+    song, but only written to a scratch file in work_dir, which should preferably be scratch_dir(). Characters that
+    SONG_ENCODING cannot hold are compiled as '?', and listed in the first line of the warnings.
+    :param chordii_command: The chordii executable to run
+    :type chordii_command: str
+    :param text: The ChordPro text
+    :type text: str
+    :param file_name: The name chordii is given for the song, without directory and extension
+    :type file_name: str
+    :param work_dir: The directory to write the song in while it is compiled. Every call uses its own directory
+        inside it, so that calls running at the same time never share files.
+    :type work_dir: str
+    :param on_start: Called with chordii and Ghostscript once each of them has started, e.g. to be able to kill them
+    :type on_start: callable
+    :param gs_command: The Ghostscript executable to run
+    :type gs_command: str
+    :param timings: If given, the time spent in chordii and Ghostscript and their peak memory use are added to it
+    :type timings: utils.timing.Timings
+    :return: The PDF, and the warnings chordii printed while compiling
+    :rtype: tuple
+    """
+    data = text.encode(SONG_ENCODING, errors='replace')
+    characters = unencodable_characters(text)
+    song_dir = tempfile.mkdtemp(dir=work_dir)
+    try:
+        input_file = os.path.join(song_dir, file_name + '.cho')
+        with open(input_file, 'wb') as f:
+            f.write(data)
+        pdf, warnings = run_chordii_to_pdf(chordii_command, [input_file], on_start=on_start, gs_command=gs_command,
+                                           timings=timings)
+    finally:
+        shutil.rmtree(song_dir, ignore_errors=True)
+    if characters:
+        warnings = "Not in {}, shown as '?': {}\n".format(
+                SONG_ENCODING, ', '.join('{} (U+{:04X})'.format(character, ord(character)) for character in characters)
+        ) + warnings
+    return pdf, warnings
+
+
+def unencodable_characters(text):
+    """
+    The characters of a text that SONG_ENCODING cannot hold.
+    :type text: str
+    :return: The characters, each once, in the order they first appear
+    :rtype: list
+    """
+    try:
+        text.encode(SONG_ENCODING)
+        return []
+    except UnicodeEncodeError:
+        pass
+    characters = []
+    for character in text:
+        if character not in characters:
+            try:
+                character.encode(SONG_ENCODING)
+            except UnicodeEncodeError:
+                characters.append(character)
+    return characters
+
+
+def scratch_dir():
+    """
+    A new directory for scratch files, in memory if the system has a place for that. Remove it when done.
+    :rtype: str
+    """
+    for directory in RAM_DIRS:
+        if directory and os.path.isdir(directory) and os.access(directory, os.W_OK | os.X_OK):
+            try:
+                return tempfile.mkdtemp(prefix='qtchordii-', dir=directory)
+            except OSError:
+                pass
+    return tempfile.mkdtemp(prefix='qtchordii-')
+
+
+def count_pages(ps_file):
+    """
+    Count the pages of a PostScript file by its %%Page: comments.
+    :type ps_file: str
+    :rtype: int
+    """
+    with open(ps_file, 'rb') as f:
+        return sum(1 for line in f if line.startswith(b'%%Page:'))
+
+
+def extract_pages(ps_file, first_page, out_file):
+    """
+    Copy the pages of a PostScript file from the first_page'th on to another file, along with the prolog before the
+    first page, so that the copy can be printed on its own.
+    :param ps_file: The file to copy from
+    :type ps_file: str
+    :param first_page: The ordinal of the first page to copy, counting from 1
+    :type first_page: int
+    :param out_file: The file to copy to
+    :type out_file: str
+    :return: The number of pages copied
+    :rtype: int
+    """
+    page = 0
+    copied = 0
+    with open(ps_file, 'rb') as f, open(out_file, 'wb') as out:
+        for line in f:
+            if line.startswith(b'%%Page:'):
+                page += 1
+                if page >= first_page:
+                    copied += 1
+            if page == 0 or page >= first_page:
+                out.write(line)
+    return copied
@@ -0,0 +1,189 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class CompileCache:
+    """
+    On-disk cache of PostScript compiled from single songs.
+
+    Entries are keyed on a hash of the song file and the chordii flags used to compile it. The flags include the page
+    the song starts on, as chordii prints the page numbers. Entries are evicted least recently used first once the
+    cache grows beyond max_size bytes, when evict() is called. The manifest is plain JSON, so the cache can be
+    inspected by hand as well as through entries(). The cache may be shared by several build threads.
+    """
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._entries = {}
+        self._pages = {}
+        self._lock = threading.RLock()
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.load()
+
+    @staticmethod
+    def digest(file_path):
+        """
+        Hash the contents of a song file.
+        :type file_path: str
+        :rtype: str
+        """
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(digest, flags):
+        """
+        Combine the hash of a song file with the chordii flags it is compiled with.
+        :type digest: str
+        :type flags: list
+        :rtype: str
+        """
+        return hashlib.sha1((digest + '\0' + ' '.join(flags)).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.ps')
+
+    def get(self, key):
+        """
+        Look up a compiled song.
+        :return: The cache entry, or None if the song has to be compiled
+        :rtype: dict
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not os.path.isfile(self.path(key)):
+                del self._entries[key]
+                return None
+            entry['accessed'] = time.time()
+            return entry
+
+    def pages(self, digest):
+        """
+        The number of pages a song takes up, if it has been compiled before. Chordii starts every song on a new
+        page, so this does not depend on the flags the song was compiled with.
+        :return: The number of pages, or None if the song has not been compiled
+        :rtype: int
+        """
+        return self._pages.get(digest)
+
+    def set_pages(self, digest, pages):
+        """
+        Remember the number of pages a song takes up, e.g. when it was compiled but not put in the cache.
+        :type digest: str
+        :type pages: int
+        """
+        with self._lock:
+            self._pages[digest] = pages
+
+    def put(self, key, ps_file, source, digest, flags, pages, warnings=''):
+        """
+        Move a compiled song into the cache. Nothing is evicted, so that a build can put the songs it compiled without
+        losing the ones it took from the cache before it has used them.
+        :param ps_file: The ps file chordii produced. It is moved, not copied.
+        :param source: The ChordPro file the entry was compiled from
+        :param digest: The hash of the contents of source
+        :param pages: The number of pages in ps_file
+        :param warnings: The warnings chordii printed while compiling
+        :rtype: dict
+        """
+        shutil.move(ps_file, self.path(key))
+        entry = {
+            'source': source,
+            'digest': digest,
+            'flags': list(flags),
+            'pages': pages,
+            'warnings': warnings,
+            'size': os.path.getsize(self.path(key)),
+            'accessed': time.time()
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._pages[digest] = pages
+        return entry
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_size.
+        """
+        with self._lock:
+            total = self.total_size()
+            for key in sorted(self._entries, key=lambda k: self._entries[k]['accessed']):
+                if total <= self.max_size:
+                    break
+                total -= self._entries[key]['size']
+                self.remove(key)
+
+    def remove(self, key):
+        with self._lock:
+            del self._entries[key]
+            if os.path.isfile(self.path(key)):
+                os.remove(self.path(key))
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self.remove(key)
+            self._pages.clear()
+            self.save()
+
+    def total_size(self):
+        with self._lock:
+            return sum(entry['size'] for entry in self._entries.values())
+
+    def entries(self):
+        """
+        :return: (key, entry) pairs, most recently used first
+        :rtype: list
+        """
+        with self._lock:
+            return sorted(self._entries.items(), key=lambda item: item[1]['accessed'], reverse=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        manifest = os.path.join(self.cache_dir, self.MANIFEST)
+        if not os.path.isfile(manifest):
+            return
+        try:
+            with open(manifest, 'r') as f:
+                self._entries = json.load(f)
+        except ValueError:
+            self._entries = {}
+        self._pages = {entry['digest']: entry['pages'] for entry in self._entries.values() if 'digest' in entry}
+
+    def save(self):
+        with self._lock:
+            with open(os.path.join(self.cache_dir, self.MANIFEST), 'w') as f:
+                json.dump(self._entries, f, indent=4)
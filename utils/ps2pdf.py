@@ -15,23 +15,72 @@
 # You should have received a copy of the GNU General Public License
 # along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
 
-import os
 import subprocess
 
+from utils.timing import stage, watch_memory
 
-def ps2pdf(file_name):
+GS_PDF_OPTIONS = ['-q', '-dSAFER', '-dBATCH', '-dNOPAUSE', '-sDEVICE=pdfwrite', '-sstdout=%stderr']
+
+
+class Ps2PdfError(Exception):
+    """
+    Raised when Ghostscript exits with a non-zero status.
+    """
+    def __init__(self, output):
+        super().__init__(output)
+        self.output = output
+
+
+def merge_to_pdf(ps_files, out_file_name, gs_command='gs', timings=None, on_start=None):
     """
-    Converts a file from PostScript to PDF
-    :param file_name: Name of the ps file to convert (without extension)
+    Converts several PostScript files to a single PDF, keeping the order of the files
+    :param ps_files: Names of the ps files to convert (with extension)
+    :type ps_files: list
+    :param out_file_name: Name of the resulting pdf file (with extension)
+    :type out_file_name: str
+    :param gs_command: The Ghostscript executable to run
+    :type gs_command: str
+    :param timings: If given, the time spent converting and the peak memory use are added to it
+    :type timings: utils.timing.Timings
+    :param on_start: Called with the Ghostscript process once it has started, e.g. to be able to kill it
+    :type on_start: callable
+    :raises Ps2PdfError: If the conversion failed
     :rtype: str
     """
-    out_file_name = file_name + '.pdf'
-    try:
-        output = subprocess.check_output(['ps2pdf', file_name + '.ps', out_file_name],
-                                         stderr=subprocess.STDOUT).decode()
-        print('ps2pdf returned:', output)
-    except subprocess.CalledProcessError:
-        return None
-    finally:
-        os.remove(file_name + '.ps')
+    command = [gs_command] + GS_PDF_OPTIONS + ['-sOutputFile=' + out_file_name] + list(ps_files)
+    with stage(timings, 'ps2pdf', files=len(ps_files)) as details:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        with watch_memory(process, details):
+            if on_start is not None:
+                on_start(process)
+            output = process.communicate()[0].decode()
+    if process.returncode:
+        raise Ps2PdfError(output)
     return out_file_name
+
+
+def ps2pdf_stream(ps_stream, on_start=None, gs_command='gs', timings=None):
+    """
+    Converts PostScript read from a pipe to PDF, without writing any files
+    :param ps_stream: The PostScript to convert, e.g. the stdout of another process
+    :type ps_stream: file
+    :param on_start: Called with the converter process once it has started, e.g. to be able to kill it
+    :type on_start: callable
+    :param gs_command: The Ghostscript executable to run
+    :type gs_command: str
+    :param timings: If given, the time spent converting and the peak memory use are added to it
+    :type timings: utils.timing.Timings
+    :return: The PDF
+    :rtype: bytes
+    :raises Ps2PdfError: If the conversion failed
+    """
+    with stage(timings, 'ps2pdf') as details:
+        process = subprocess.Popen([gs_command] + GS_PDF_OPTIONS + ['-sOutputFile=-', '-'],
+                                   stdin=ps_stream, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with watch_memory(process, details):
+            if on_start is not None:
+                on_start(process)
+            pdf, output = process.communicate()
+    if process.returncode:
+        raise Ps2PdfError(output.decode())
+    return pdf
@@ -0,0 +1,207 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# A long session keeps this many of its most recent events for the trace
+MAX_EVENTS = 100000
+SAMPLE_INTERVAL = 0.005
+
+
+class MemoryMonitor(threading.Thread):
+    """
+    Follows the peak resident set size of a running process by reading its VmHWM from /proc every SAMPLE_INTERVAL
+    seconds. The ru_maxrss that wait4() reports is no use for this on Linux, as it includes the memory of the process
+    the program was started from. Where there is no /proc, the peak is not known.
+    """
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.peak = None
+        self._stopped = threading.Event()
+        try:
+            # The directory keeps referring to the same process, even if its pid is reused later
+            self._proc_dir = os.open('/proc/{}'.format(pid), os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+        except OSError:
+            self._proc_dir = None
+            return
+        self.start()
+
+    def run(self):
+        try:
+            while self.sample() and not self._stopped.wait(SAMPLE_INTERVAL):
+                pass
+        finally:
+            os.close(self._proc_dir)
+
+    def sample(self):
+        """
+        :return: Whether the process still has its memory
+        :rtype: bool
+        """
+        try:
+            fd = os.open('status', os.O_RDONLY, dir_fd=self._proc_dir)
+        except OSError:
+            return False
+        with os.fdopen(fd, 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    self.peak = max(self.peak or 0, int(line.split()[1]) * 1024)
+                    return True
+        return False
+
+    def stop(self):
+        """
+        :return: The peak resident set size in bytes, or None if it is not known
+        :rtype: int
+        """
+        self._stopped.set()
+        if self._proc_dir is not None:
+            self.join()
+        return self.peak
+
+
+@contextmanager
+def watch_memory(process, details):
+    """
+    Follow the memory use of a process until the end of the block, which should wait for the process to exit, and
+    store its peak resident set size in details['peak_rss'].
+    :type process: subprocess.Popen
+    :param details: The details of a stage, see Timings.stage()
+    :type details: dict
+    """
+    monitor = MemoryMonitor(process.pid)
+    try:
+        yield
+    finally:
+        details['peak_rss'] = monitor.stop()
+
+
+class Timings:
+    """
+    Wall clock time spent in the named stages of a build, and the peak memory used by the programs run in them.
+    Every time a stage is timed is also kept as an event, so that a whole session can be saved as a trace.
+    """
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.peak_rss = {}
+        self.last = {}
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **args):
+        """
+        Time a block of code, adding to the time already spent in the stage. The block can add details to the event
+        through the dict it is given, such as 'peak_rss' in bytes for a program it ran.
+        :type name: str
+        :param args: Details about this time the stage is run, e.g. the page rendered
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.perf_counter() - start, args)
+
+    def add(self, name, start, seconds, args):
+        """
+        Record a stage that was timed elsewhere.
+        :type name: str
+        :param start: The time.perf_counter() the stage started at
+        :type start: float
+        :type seconds: float
+        :type args: dict
+        """
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            if args.get('peak_rss') is not None:
+                self.peak_rss[name] = max(self.peak_rss.get(name, 0), args['peak_rss'])
+            self.last[name] = seconds, args
+            self.events.append((name, start, seconds, threading.get_ident(), args))
+
+    def report(self):
+        """
+        :return: One line for each stage, in the order the stages were first timed
+        :rtype: str
+        """
+        width = max((len(name) for name in self.stages), default=0)
+        lines = []
+        for name, seconds in self.stages.items():
+            line = '{:<{}}  {:8.3f} s'.format(name, width, seconds)
+            if name in self.peak_rss:
+                line += '  {:8.1f} MB peak'.format(self.peak_rss[name] / 2 ** 20)
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def summary(self, names):
+        """
+        :param names: The stages to include
+        :type names: list
+        :return: The last time each of the stages was timed, on one line
+        :rtype: str
+        """
+        parts = []
+        for name in names:
+            if name not in self.last:
+                continue
+            seconds, args = self.last[name]
+            part = '{} {:.0f} ms'.format(name, seconds * 1000)
+            if args.get('peak_rss') is not None:
+                part += ' ({:.1f} MB)'.format(args['peak_rss'] / 2 ** 20)
+            parts.append(part)
+        return ', '.join(parts)
+
+    def trace(self):
+        """
+        The events in the Trace Event Format, which chrome://tracing and Perfetto can show.
+        :rtype: dict
+        """
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        threads = {}
+        trace_events = []
+        for name, start, seconds, thread, args in events:
+            trace_events.append({'name': name, 'ph': 'X', 'pid': pid, 'tid': threads.setdefault(thread, len(threads)),
+                                 'ts': (start - self.origin) * 1e6, 'dur': seconds * 1e6, 'args': args})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def save_trace(self, filename):
+        """
+        Save the events as a trace, see trace().
+        :type filename: str
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.trace(), f)
+
+
+@contextmanager
+def stage(timings, name, **args):
+    """
+    Time a block of code if timings is given, and do nothing otherwise.
+    :type timings: Timings
+    """
+    if timings is None:
+        yield args
+    else:
+        with timings.stage(name, **args) as details:
+            yield details
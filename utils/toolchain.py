@@ -0,0 +1,185 @@
+# Copyright (C) 2013-2016 Johan Reitan
+#
+# This file is part of QtChordii.
+#
+# QtChordii is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QtChordii is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+from collections import namedtuple
+
+from utils.which import search_path, which
+
+CHORDII_NAMES = ('chordii', 'chordii430')
+GS = 'gs'
+TOOL_NAMES = CHORDII_NAMES + (GS,)
+# The options that make a tool print its version
+VERSION_OPTIONS = {'chordii': ['-V'], 'chordii430': ['-V'], GS: ['--version']}
+PROBE_TIMEOUT = 5
+
+# A tool that could not be found has an empty path, and the time the search path was last changed as its mtime
+Tool = namedtuple('Tool', 'path version mtime')
+
+
+def probe(name, path):
+    """
+    Look up the version and modification time of a program.
+    :param name: The name of the tool, which tells how to ask for its version
+    :type name: str
+    :param path: The program
+    :type path: str
+    :return: The tool, or None if path is not a file
+    :rtype: Tool
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    version = ''
+    if name in VERSION_OPTIONS:
+        try:
+            process = subprocess.Popen([path] + VERSION_OPTIONS[name], stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            try:
+                output = process.communicate(timeout=PROBE_TIMEOUT)[0]
+            except subprocess.TimeoutExpired:
+                process.kill()
+                output = process.communicate()[0]
+            version = next((line.strip() for line in output.decode(errors='replace').splitlines() if line.strip()), '')
+        except (OSError, subprocess.SubprocessError):
+            pass
+    return Tool(path, version, mtime)
+
+
+def path_mtime(path):
+    """
+    The last time a program was added to or removed from a search path, going by the modification times of its
+    directories.
+    :param path: Directories separated by os.pathsep
+    :type path: str
+    :rtype: float
+    """
+    mtime = 0.0
+    for directory in path.split(os.pathsep):
+        try:
+            mtime = max(mtime, os.stat(directory or os.curdir).st_mtime)
+        except OSError:
+            pass
+    return mtime
+
+
+def missing(path):
+    """
+    :return: The result of looking for a tool that is not in path
+    :rtype: Tool
+    """
+    return Tool('', '', path_mtime(path))
+
+
+def is_current(tool, path):
+    """
+    Whether a tool found earlier is still there, unchanged, or one that was not found is still not in the path.
+    :type tool: Tool
+    :param path: The search path the tool was looked for in
+    :type path: str
+    :rtype: bool
+    """
+    if not tool.path:
+        return tool.mtime == path_mtime(path)
+    try:
+        return os.stat(tool.path).st_mtime == tool.mtime
+    except OSError:
+        return False
+
+
+class Toolchain:
+    """
+    Finds chordii and Ghostscript, each at most once. Tools found by an earlier run are reused as long as
+    the directories searched are the same and the programs have not been modified since, which saves both the search
+    and running them to ask for their versions. Tools that were not found are not looked for again until a program is
+    added to or removed from one of the directories.
+    """
+    def __init__(self, saved_search_path=None, saved_tools=None):
+        """
+        :param saved_search_path: The search path the saved tools were found in
+        :type saved_search_path: str
+        :param saved_tools: Tools found by an earlier run, by name
+        :type saved_tools: dict
+        """
+        self.search_path = search_path()
+        self.saved = dict(saved_tools or {}) if saved_search_path == self.search_path else {}
+        self.tools = {}
+        self.changed = False
+
+    def resolve(self, name):
+        """
+        :param name: One of TOOL_NAMES
+        :type name: str
+        :return: The tool, or None if it could not be found
+        :rtype: Tool
+        """
+        if name not in self.tools:
+            tool = self.saved.get(name)
+            if tool is None or not is_current(tool, self.search_path):
+                path = which(name, self.search_path)
+                tool = (probe(name, path) if path else None) or missing(self.search_path)
+                self.changed = True
+            self.tools[name] = tool
+        tool = self.tools[name]
+        return tool if tool.path else None
+
+    def path(self, name):
+        """
+        :return: The program, or None if it could not be found
+        :rtype: str
+        """
+        tool = self.resolve(name)
+        return tool.path if tool else None
+
+    def version(self, name):
+        """
+        :return: The first line the tool printed when asked for its version, or '' if it could not be found
+        :rtype: str
+        """
+        tool = self.resolve(name)
+        return tool.version if tool else ''
+
+    def chordii(self):
+        """
+        :return: The first of CHORDII_NAMES that could be found, or None
+        :rtype: str
+        """
+        for name in CHORDII_NAMES:
+            path = self.path(name)
+            if path is not None:
+                return path
+        return None
+
+    def set_chordii(self, path):
+        """
+        Use a chordii executable that is not in the search path, e.g. one the user picked.
+        :type path: str
+        """
+        self.tools[CHORDII_NAMES[0]] = probe(CHORDII_NAMES[0], path) or missing(self.search_path)
+        self.changed = True
+
+    def results(self):
+        """
+        :return: What this run or an earlier one found when looking for each tool, including the tools that were not
+            found, by name. This is what is saved for the next run.
+        :rtype: dict
+        """
+        tools = dict(self.saved)
+        tools.update(self.tools)
+        return tools
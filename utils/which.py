@@ -16,28 +16,39 @@
 # along with QtChordii.  If not, see <http://www.gnu.org/licenses/>.
 
 
-def which(program):
+import os
+
+
+def search_path():
     """
-    Check if the program is in PATH.
+    The directories searched for programs: the current directory, followed by the PATH.
+    :rtype: str
     """
-    import os
+    return os.pathsep.join([os.getcwd(), os.environ.get('PATH', '')])
+
 
+def which(program, path=None):
+    """
+    Check if the program is in PATH.
+    :param program: The name of the program, or a path to it
+    :type program: str
+    :param path: The directories to search, separated by os.pathsep (default: search_path())
+    :type path: str
+    :return: The absolute path to the program, or None if it could not be found
+    :rtype: str
+    """
     def is_exe(file_path):
         return os.path.isfile(file_path) and os.access(file_path, os.X_OK)
 
-    for file in os.listdir("."):
-        if file.startswith("chordii"):
-            if is_exe(file):
-                return file
     fpath, fname = os.path.split(program)
     if fpath:
         if is_exe(program):
-            return program
+            return os.path.abspath(program)
     else:
-        for path in os.environ["PATH"].split(os.pathsep):
-            path = path.strip('"')
-            exe_file = os.path.join(path, program)
-            if is_exe(exe_file):
-                return exe_file
+        for directory in (search_path() if path is None else path).split(os.pathsep):
+            directory = directory.strip('"')
+            exe_file = os.path.join(directory, program)
+            if directory and is_exe(exe_file):
+                return os.path.abspath(exe_file)
 
     return None